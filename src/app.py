@@ -1,35 +1,24 @@
+import importlib
+import os
 import sys
+import time
 from datetime import datetime
+from threading import Thread
 
-import cv2
-import numpy as np
+# Startup time is measured from here to the first camera frame on the screen
+startup_started = time.perf_counter()
 
-from queue import Queue
-from time import sleep
-
-from PyQt5.QtCore import pyqtSignal, pyqtSlot, Qt, QThread
-from PyQt5.QtWidgets import QHBoxLayout, QVBoxLayout, QPushButton, QApplication, QMainWindow, QWidget, QSlider, QLabel
+from PyQt5.QtCore import pyqtSignal, pyqtSlot, Qt, QThread, QTimer
+from PyQt5.QtWidgets import QHBoxLayout, QVBoxLayout, QPushButton, QApplication, QMainWindow, QWidget, QSlider, QLabel, \
+    QCheckBox, QSizePolicy, QSpinBox, QComboBox, QListView
 from PyQt5.QtGui import QImage, QPixmap, QFont
 
-from scroll import Scroller
-from video_processing import VideoProcessing
+# Only what the empty window needs is imported here. OpenCV, NumPy and the modules using them are imported
+# in finish_startup() once the window is shown, the eye tracker in the background after the first frame.
+from scroll import Scroller, ScrollActuator
+from gaze_events import GazeEventBus
 from consts import *
 
-class WebCamThread(QThread):
-    change_pixmap_signal = pyqtSignal(np.ndarray)
-
-    def run(self):
-        self.lock = False
-        cap = cv2.VideoCapture(0)
-        while cap.isOpened():
-            if self.lock:
-                break
-            ret, cv_img = cap.read()
-            if ret:
-                self.change_pixmap_signal.emit(cv_img)
-        cap.release()
-        cv2.destroyAllWindows()
-
 # class ChatThread(QThread):
 #     update_chat_signal = pyqtSignal(str)
 #
@@ -41,6 +30,8 @@ class Main(QMainWindow):
         super(Main, self).__init__()
         self.app = MainWidget()
         self.init_ui()
+        # Camera, models and the chat history are set up once the window is on the screen
+        QTimer.singleShot(0, self.app.finish_startup)
 
     def init_ui(self):
         self.setWindowTitle('Eye Tracking App')
@@ -49,17 +40,22 @@ class Main(QMainWindow):
         self.show()
 
     def closeEvent(self, event) -> None:
-        if type(self.app.thread) is not WebCamThread:
-            self.app.eye_tracker.lock = True
-        else:
-            self.app.thread.lock = True
-        sleep(0.5)
+        self.app.shutdown_eye_tracking()
+        if self.app.camera_service is not None:
+            self.app.camera_service.stop()
+            self.app.camera_service.join()
+        if self.app.metrics_dumper is not None:
+            self.app.metrics_dumper.stop()
+        if self.app.chat_history is not None:
+            self.app.chat_history.log.close()
+        self.app.record_checkbox.setChecked(False)
         return super().closeEvent(event)
 
 
 class MainWidget(QWidget):
     update_blink_signal = pyqtSignal(float)
     update_eye_direction_signal = pyqtSignal(float)
+    update_pupil_locator_signal = pyqtSignal(str)
 
     def __init__(self):
         super().__init__()
@@ -67,12 +63,15 @@ class MainWidget(QWidget):
         self.display_height = 1024
         self.label = QLabel('Status:\n\nUnknown')
 
-        self.chat_history = []
-        self.chat_label = None
+        # Created by finish_startup()
+        self.chat_history = None
+        self.chat_log_timer = QTimer(self)
+        self.chat_view = None
         self.eye_direction_slider = None
 
         self.start_acq_button = QPushButton('Start Eye Tracking')
         self.start_acq_button.clicked.connect(self.start_eye_tracking)
+        self.start_acq_button.setDisabled(True)
 
         self.stop_acq_button = QPushButton('Stop Eye Tracking')
         self.stop_acq_button.clicked.connect(self.stop_eye_tracking)
@@ -84,21 +83,56 @@ class MainWidget(QWidget):
 
         self.image_from_camera = QLabel(self)
         self.image_from_camera.resize(self.dispaly_width, self.display_height)
-
-        self.thread = WebCamThread()
-        self.thread.change_pixmap_signal.connect(self.update_image)
-        self.thread.start()
-        self.data_queue = Queue()
-
-        self.frames_to_wait = QLabel('Frames to wait: 10')
-        self.frames_to_wait.setAlignment(Qt.AlignBottom)
-
-        self.frames_slider = QSlider(Qt.Horizontal)
-        self.frames_slider.setMinimum(5)
-        self.frames_slider.setMaximum(60)
-        self.frames_slider.setValue(10)
-        self.frames_slider.valueChanged.connect(
-            lambda: self.frames_to_wait.setText('Frames to wait: ' + str(self.frames_slider.value())))
+        # Size follows the layout, not the pixmap, frames are rendered to whatever size the label has
+        self.image_from_camera.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Ignored)
+        self.image_from_camera.setMinimumSize(640, 480)
+
+        self.preview_checkbox = QCheckBox('Show camera preview')
+        self.preview_checkbox.setChecked(True)
+
+        # Live FPS, stage latencies and dropped frame counters, refreshed by the eye tracker
+        self.metrics_label = QLabel()
+        self.metrics_label.setFont(QFont('Monospace', 9))
+        self.metrics_label.setAlignment(Qt.AlignTop)
+        self.metrics_checkbox = QCheckBox('Show metrics')
+        self.metrics_checkbox.toggled.connect(self.metrics_label.setVisible)
+        self.metrics_label.setVisible(False)
+
+        # Raw camera frames with capture timestamps, for replaying sessions in benchmark.py and headless.py
+        self.recorder = None
+        self.record_checkbox = QCheckBox('Record session')
+        self.record_checkbox.toggled.connect(self.toggle_recording)
+        self.record_checkbox.setDisabled(True)
+
+        # Preview mailbox, camera service and metrics dumper, created by finish_startup()
+        self.frame_mailbox = None
+        self.display_timer = QTimer(self)
+        self.display_timer.timeout.connect(self.show_latest_frame)
+        self.metrics_dumper = None
+        self.camera_service = None
+        self.startup_reported = False
+        self.eye_tracker = None
+        self.scroller = None
+        self.gaze_events = None
+
+        self.camera_spinbox = QSpinBox()
+        self.camera_spinbox.setPrefix('Camera: ')
+        self.camera_spinbox.setRange(0, 9)
+        self.camera_spinbox.setValue(camera)
+
+        # Filled by finish_startup()
+        self.pupil_locator_combo = QComboBox()
+
+        self.dwell_time = QLabel(f'Dwell time: {scroll_dwell_ms} ms')
+        self.dwell_time.setAlignment(Qt.AlignBottom)
+
+        self.dwell_slider = QSlider(Qt.Horizontal)
+        self.dwell_slider.setMinimum(100)
+        self.dwell_slider.setMaximum(3000)
+        self.dwell_slider.setSingleStep(50)
+        self.dwell_slider.setValue(scroll_dwell_ms)
+        self.dwell_slider.valueChanged.connect(
+            lambda: self.dwell_time.setText(f'Dwell time: {self.dwell_slider.value()} ms'))
 
         self.scroll_ticks = QLabel('Scroll ticks: 20')
         self.scroll_ticks.setAlignment(Qt.AlignBottom)
@@ -111,37 +145,93 @@ class MainWidget(QWidget):
 
         self.init_ui()
 
+    def finish_startup(self):
+        """Opens the camera and loads everything else the window does not need to be shown."""
+        from camera import CameraService
+        from chat_history import ChatLog, ChatHistoryModel
+        from metrics import metrics, MetricsDumper
+        from preview import PreviewMailbox
+        from pupil import PUPIL_LOCATORS
+        import models
+
+        # Camera threads only leave their newest frame here, the GUI picks it up at most max_display_fps times
+        # per second, so a slow preview drops frames instead of queueing them in the event loop.
+        # Frames are converted and resized to the label size in the camera threads.
+        self.frame_mailbox = PreviewMailbox(self.dispaly_width, self.display_height)
+        self.display_timer.start(int(1000 / max_display_fps))
+        metrics.gauge('preview_dropped', lambda: self.frame_mailbox.dropped)
+        metrics.gauge('preview_skipped', lambda: self.frame_mailbox.skipped)
+        if metrics_file:
+            self.metrics_dumper = MetricsDumper(metrics, metrics_file, metrics_dump_interval)
+            self.metrics_dumper.start()
+
+        # Camera stays open for the whole run, the preview and the eye tracker subscribe to its frames
+        self.camera_service = CameraService(self.camera_spinbox.value())
+        self.camera_service.subscribe(self.frame_mailbox.put)
+        self.camera_service.start()
+        self.camera_spinbox.valueChanged.connect(self.camera_service.set_camera)
+        # Cascades are parsed while the preview is running, not when eye tracking is started
+        models.preload()
+
+        self.pupil_locator_combo.addItems(PUPIL_LOCATORS)
+        self.pupil_locator_combo.setCurrentText(pupil_locator)
+        self.pupil_locator_combo.currentTextChanged.connect(self.update_pupil_locator_signal.emit)
+
+        # Only the newest phrases are kept in memory, the whole session is in the log file
+        self.chat_history = ChatHistoryModel(ChatLog.for_session(chat_log_dir, chat_log_flush_interval),
+                                             chat_history_capacity)
+        self.chat_view.setModel(self.chat_history)
+        self.chat_log_timer.timeout.connect(self.chat_history.log.flush)
+        self.chat_log_timer.start(int(chat_log_flush_interval * 1000))
+        self.start_acq_button.setDisabled(False)
+        self.record_checkbox.setDisabled(False)
+
     def start_eye_tracking(self):
-        self.thread.lock = True
-        del self.thread
-        sleep(0.5)
+        # Usually already imported in the background after the first frame
+        from video_processing import VideoProcessing
+
+        # The eye tracker puts annotated frames to the preview instead of the camera
+        self.camera_service.unsubscribe(self.frame_mailbox.put)
         self.start_acq_button.setDisabled(True)
         # self.calibrate_button.setDisabled(False)
         self.stop_acq_button.setDisabled(False)
-        self.frames_slider.setDisabled(True)
+        self.dwell_slider.setDisabled(True)
         self.ticks_slider.setDisabled(True)
-        self.eye_tracker = VideoProcessing(self.data_queue)
-        self.eye_tracker.change_pixmap_signal.connect(self.update_image)
+        # A closed bus cannot be reused, every run gets a new one
+        self.gaze_events = GazeEventBus(gaze_event_capacity)
+        self.eye_tracker = VideoProcessing(self.gaze_events, self.frame_mailbox, self.camera_service)
         self.eye_tracker.update_chat_signal.connect(self.update_chat)
+        self.eye_tracker.metrics_signal.connect(self.update_metrics)
         self.update_blink_signal.connect(self.eye_tracker.change_blink_sensitivity)
         self.update_eye_direction_signal.connect(self.eye_tracker.change_eye_direction_sensitivity)
-        self.scroller = Scroller(self.data_queue, self.frames_slider.value(), self.ticks_slider.value())
+        self.update_pupil_locator_signal.connect(self.eye_tracker.change_pupil_locator)
+        self.eye_tracker.set_pupil_locator(self.pupil_locator_combo.currentText())
+        self.scroller = Scroller(self.gaze_events, self.dwell_slider.value() / 1000, self.ticks_slider.value(),
+                                 ScrollActuator(scroll_min_interval_ms / 1000))
         self.scroller.start()
         self.eye_tracker.start()
         self.label.setText('Status:\n\nEye tracking is running')
 
+    def shutdown_eye_tracking(self):
+        if self.eye_tracker is not None:
+            self.update_blink_signal.disconnect(self.eye_tracker.change_blink_sensitivity)
+            self.update_eye_direction_signal.disconnect(self.eye_tracker.change_eye_direction_sensitivity)
+            self.update_pupil_locator_signal.disconnect(self.eye_tracker.change_pupil_locator)
+            self.eye_tracker.stop()
+            self.eye_tracker.wait()
+            self.eye_tracker = None
+        if self.scroller is not None:
+            self.gaze_events.close()
+            self.scroller.join()
+            self.scroller = None
+
     def stop_eye_tracking(self):
-        self.eye_tracker.lock = True
-        del self.eye_tracker
-        del self.scroller
-        sleep(0.5)
-        self.thread = WebCamThread()
-        self.thread.change_pixmap_signal.connect(self.update_image)
-        self.thread.start()
+        self.shutdown_eye_tracking()
+        self.camera_service.subscribe(self.frame_mailbox.put)
         self.stop_acq_button.setDisabled(True)
         # self.calibrate_button.setDisabled(True)
         self.start_acq_button.setDisabled(False)
-        self.frames_slider.setDisabled(False)
+        self.dwell_slider.setDisabled(False)
         self.ticks_slider.setDisabled(False)
         self.label.setText('Status: Eye tracking is stopped. Camera ready')
 
@@ -161,6 +251,11 @@ class MainWidget(QWidget):
         buttons_layout = QVBoxLayout()
         buttons_layout.addWidget(self.start_acq_button)
         buttons_layout.addWidget(self.stop_acq_button)
+        buttons_layout.addWidget(self.preview_checkbox)
+        buttons_layout.addWidget(self.camera_spinbox)
+        buttons_layout.addWidget(self.pupil_locator_combo)
+        buttons_layout.addWidget(self.metrics_checkbox)
+        buttons_layout.addWidget(self.record_checkbox)
         # buttons_layout.addWidget(self.calibrate_button)
 
         sliders_layout = QVBoxLayout()
@@ -183,6 +278,7 @@ class MainWidget(QWidget):
         self.eye_blink.setMaximumWidth(500)
 
         sliders_layout.addWidget(self.label)
+        sliders_layout.addWidget(self.metrics_label)
         sliders_layout.addWidget(QLabel("Eye direction sensitivity"))
         sliders_layout.addWidget(self.eye_direction_slider)
         sliders_layout.addWidget(QLabel("Eye blink sensitivity"))
@@ -196,20 +292,17 @@ class MainWidget(QWidget):
         chat_title_label = QLabel()
         chat_title_label.setFont(QFont('Arial', 20, QFont.Bold))
         chat_title_label.setText("Messages history:")
-        self.chat_label = QLabel()
-        self.chat_label.setFont(QFont('Arial', 15))
-        self.chat_label.setMinimumWidth(400)
-        self.chat_label.setAlignment(Qt.AlignLeft)
-        self.chat_label.setText("")
+        self.chat_view = QListView()
+        self.chat_view.setFont(QFont('Arial', 15))
+        self.chat_view.setMinimumWidth(400)
+        self.chat_view.setUniformItemSizes(True)
         chat_history_panel.addWidget(chat_title_label)
-        chat_history_panel.addWidget(self.chat_label)
-        chat_history_panel.addStretch()
+        chat_history_panel.addWidget(self.chat_view, 1)
         # chat_history_panel.setStyleSheet("background-color:red;")
 
         # Połączony widok z kamery oraz panelu z kontrolkami
         canera_with_controls_panel = QVBoxLayout()
-        canera_with_controls_panel.addWidget(self.image_from_camera)
-        canera_with_controls_panel.addStretch()
+        canera_with_controls_panel.addWidget(self.image_from_camera, 1)
         canera_with_controls_panel.addLayout(tracking_controls_panel)
 
         # Połączenie panelu czatu razem z widokiem z kamery i kontrolkami
@@ -227,30 +320,59 @@ class MainWidget(QWidget):
         value = self.eye_blink.value()
         self.update_blink_signal.emit(value/100)
 
-    @pyqtSlot(np.ndarray)
-    def update_image(self, cv_img):
-        qt_img = self.convert_cv_qt(cv_img)
-        self.image_from_camera.setPixmap(qt_img)
+    def toggle_recording(self, checked: bool):
+        if checked and self.recorder is None:
+            from recording import SessionRecorder
+
+            os.makedirs(recordings_dir, exist_ok=True)
+            path = os.path.join(recordings_dir, datetime.now().strftime('session-%Y%m%d-%H%M%S.aocrec'))
+            self.recorder = SessionRecorder(path, recording_codec)
+            self.recorder.start()
+            self.camera_service.subscribe(self.recorder.put)
+            print(f"Recording to {path}")
+        elif not checked and self.recorder is not None:
+            self.camera_service.unsubscribe(self.recorder.put)
+            self.recorder.stop()
+            self.recorder.join()
+            print(f"Recorded {self.recorder.recorded} frames, dropped {self.recorder.dropped}")
+            self.recorder = None
+
+    def update_metrics(self, snapshot: dict):
+        from metrics import format_text
+
+        if self.metrics_label.isVisible():
+            self.metrics_label.setText(format_text(snapshot))
+
+    def show_latest_frame(self):
+        # Nothing is rendered for a minimised window or when the preview is switched off
+        self.frame_mailbox.enabled = self.preview_checkbox.isChecked() and not self.window().isMinimized()
+        self.frame_mailbox.set_target_size(self.image_from_camera.width(), self.image_from_camera.height())
+
+        item = self.frame_mailbox.take()
+        if item is None:
+            return
+        _, rgb_image = item
+        h, w, ch = rgb_image.shape
+        qt_img = QImage(rgb_image.data, w, h, ch * w, QImage.Format_RGB888)
+        self.image_from_camera.setPixmap(QPixmap.fromImage(qt_img))
         if self.label.text() == 'Status:\n\nUnknown':
             self.label.setText('Status:\n\nCamera ready')
+        if not self.startup_reported:
+            self.startup_reported = True
+            self.report_startup()
+            # The eye tracker with gaze detection is imported while the user looks at the preview
+            Thread(target=importlib.import_module, args=('video_processing',), daemon=True).start()
+
+    def report_startup(self):
+        elapsed = time.perf_counter() - startup_started
+        print(f"Startup: first camera frame after {elapsed:.2f}s (budget {startup_budget:.2f}s)")
+        if elapsed > startup_budget:
+            print("Startup took longer than the budget, run startup_report.py to see slow imports")
 
     @pyqtSlot(str, str)
     def update_chat(self, value: str, time: str):
         print(f"CHAT UPDATED!: {value}")
-        self.chat_history.append((value, time))
-        text = ""
-        for i in range(len(self.chat_history)):
-            value, time = self.chat_history[len(self.chat_history) - 1 - i]
-            text += f"{time}:\t" + value + "\n"
-        self.chat_label.setText(text)
-
-    def convert_cv_qt(self, cv_img):
-        rgb_image = cv2.cvtColor(cv_img, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb_image.shape
-        bytes_per_line = ch * w
-        convert_to_Qt_format = QImage(rgb_image.data, w, h, bytes_per_line, QImage.Format_RGB888)
-        p = convert_to_Qt_format.scaled(self.dispaly_width, self.display_height, Qt.KeepAspectRatio)
-        return QPixmap.fromImage(p)
+        self.chat_history.add(value, time)
 
 
 def main():
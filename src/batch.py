@@ -0,0 +1,197 @@
+"""Re-analyses many recorded sessions on a process pool.
+
+Usage: python batch.py CLIP [CLIP ...] --output-dir results [--workers N] [--chunk-frames N]
+
+Clips are video files, session recordings or image directories (see sources.open_source).
+They are split into chunks of chunk_frames frames, chunks are processed by a ProcessPoolExecutor
+whose workers load the cascades once. The last chunk of a clip reads until the clip ends, frame
+counts of some video files are only estimates. Results of every clip are appended in frame order to
+OUTPUT_DIR/<clip name>-<hash of its path>.jsonl as soon as all preceding chunks are done.
+progress.json records how far every clip got, running the same command again resumes an
+interrupted run, clips are started over when chunk_frames changed in between.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from headless import result_row
+from sources import open_source
+
+PROGRESS_FILE = 'progress.json'
+
+detector = None
+
+
+def init_worker(pupil_locator: str) -> None:
+    global detector
+    from gaze import GazeDetector
+
+    detector = GazeDetector()
+    detector.set_pupil_locator(pupil_locator)
+
+
+def process_chunk(clip: str, chunk: int, start: int, end):
+    """Returns (clip, chunk, result rows, worker pid, seconds spent), end None reads until the clip ends."""
+    started = time.perf_counter()
+    # Every chunk starts without tracking state left over from another clip or chunk
+    detector.face_tracker.lose()
+    if detector.motion_gate is not None:
+        detector.motion_gate.reset()
+    detector.blink_detector.reset()
+    if detector.eye_smoothers is not None:
+        for smoother in detector.eye_smoothers.values():
+            smoother.reset()
+
+    rows = []
+    with open_source(clip) as source:
+        for frame_number, timestamp, frame in source.frames(start):
+            if end is not None and frame_number >= end:
+                break
+            blink, eye_status = detector.detect(frame, None, timestamp)
+            rows.append(result_row(frame_number, timestamp, blink, eye_status))
+    return clip, chunk, rows, os.getpid(), time.perf_counter() - started
+
+
+def clip_chunks(clip: str, chunk_frames: int):
+    """(start, end) frame ranges of the clip, the last one is open-ended (end None).
+
+    Chunks past an overestimated frame count just come back empty, a clip without a frame count is one chunk.
+    """
+    with open_source(clip) as source:
+        frame_count = source.frame_count() or 0
+    starts = range(0, max(frame_count, 1), chunk_frames)
+    return [(start, start + chunk_frames) for start in starts[:-1]] + [(starts[-1], None)]
+
+
+def clip_name(clip: str) -> str:
+    """Absolute path of existing files, so progress does not depend on the working directory."""
+    return os.path.abspath(clip) if os.path.exists(clip) else clip
+
+
+def output_path(output_dir: str, clip: str) -> str:
+    # Clips of different directories often have the same name
+    stem = os.path.splitext(os.path.basename(clip.rstrip('/\\')))[0]
+    # Specs like synthetic:200 are not valid file names everywhere
+    stem = re.sub(r'[^\w.-]', '_', stem)
+    digest = hashlib.sha1(clip.encode()).hexdigest()[:8]
+    return os.path.join(output_dir, f'{stem}-{digest}.jsonl')
+
+
+class BatchRunner:
+    def __init__(self, clips, output_dir: str, workers=None, chunk_frames=300, pupil_locator='hough') -> None:
+        self.clips = [clip_name(clip) for clip in clips]
+        self.output_dir = output_dir
+        self.workers = workers or os.cpu_count()
+        self.chunk_frames = chunk_frames
+        self.pupil_locator = pupil_locator
+
+        # clip -> {'next_chunk': int, 'offset': bytes of the output already complete, 'chunk_frames': int}
+        self.progress = {}
+        # clip -> {chunk: rows} finished out of order, waiting for earlier chunks
+        self.pending = {}
+        # worker pid -> [frames, busy seconds]
+        self.worker_stats = {}
+
+    def load_progress(self) -> None:
+        path = os.path.join(self.output_dir, PROGRESS_FILE)
+        if os.path.exists(path):
+            with open(path) as file:
+                self.progress = json.load(file)
+
+    def save_progress(self) -> None:
+        path = os.path.join(self.output_dir, PROGRESS_FILE)
+        with open(path + '.tmp', 'w') as file:
+            json.dump(self.progress, file, indent=1)
+        os.replace(path + '.tmp', path)
+
+    def prepare_output(self, clip: str) -> None:
+        """Cuts off results written after the last recorded progress, e.g. by an interrupted run."""
+        state = self.progress.get(clip)
+        if state is not None and state.get('chunk_frames') != self.chunk_frames:
+            # Chunk numbers of the progress mean other frames now
+            print(f"{clip} was processed with {state.get('chunk_frames')} frames per chunk, starting it over")
+            state = None
+        if state is None:
+            state = self.progress[clip] = {'next_chunk': 0, 'offset': 0, 'chunk_frames': self.chunk_frames}
+        path = output_path(self.output_dir, clip)
+        with open(path, 'a+b') as file:
+            file.truncate(state['offset'])
+
+    def write_ready_chunks(self, clip: str) -> None:
+        state = self.progress[clip]
+        pending = self.pending.setdefault(clip, {})
+        if state['next_chunk'] not in pending:
+            return
+
+        with open(output_path(self.output_dir, clip), 'ab') as file:
+            while state['next_chunk'] in pending:
+                for row in pending.pop(state['next_chunk']):
+                    file.write((json.dumps(row) + '\n').encode())
+                state['next_chunk'] += 1
+            file.flush()
+            os.fsync(file.fileno())
+            state['offset'] = file.tell()
+        self.save_progress()
+
+    def run(self) -> None:
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.load_progress()
+
+        tasks = []
+        for clip in self.clips:
+            self.prepare_output(clip)
+            chunks = clip_chunks(clip, self.chunk_frames)
+            self.progress[clip]['chunks'] = len(chunks)
+            for chunk, (start, end) in enumerate(chunks):
+                if chunk >= self.progress[clip]['next_chunk']:
+                    tasks.append((clip, chunk, start, end))
+        self.save_progress()
+        print(f"{len(tasks)} chunks to process on {self.workers} workers")
+
+        started = time.perf_counter()
+        frames = 0
+        with ProcessPoolExecutor(self.workers, initializer=init_worker, initargs=(self.pupil_locator,)) as pool:
+            futures = [pool.submit(process_chunk, *task) for task in tasks]
+            for done, future in enumerate(as_completed(futures), 1):
+                clip, chunk, rows, pid, seconds = future.result()
+                stats = self.worker_stats.setdefault(pid, [0, 0])
+                stats[0] += len(rows)
+                stats[1] += seconds
+                frames += len(rows)
+
+                self.pending.setdefault(clip, {})[chunk] = rows
+                self.write_ready_chunks(clip)
+
+                elapsed = time.perf_counter() - started
+                print(f"[{done}/{len(tasks)}] {os.path.basename(clip)} chunk {chunk}: "
+                      f"{len(rows) / seconds if seconds else 0:.1f} FPS, total {frames / elapsed:.1f} FPS")
+
+        self.report(frames, time.perf_counter() - started)
+
+    def report(self, frames: int, elapsed: float) -> None:
+        print(f"Processed {frames} frames in {elapsed:.1f}s ({frames / elapsed if elapsed else 0:.1f} FPS)")
+        for pid, (worker_frames, seconds) in sorted(self.worker_stats.items()):
+            print(f"  worker {pid}: {worker_frames} frames, {worker_frames / seconds if seconds else 0:.1f} FPS")
+
+
+def main():
+    from consts import pupil_locator
+    from pupil import PUPIL_LOCATORS
+
+    parser = argparse.ArgumentParser(description='Batch analysis of recorded sessions')
+    parser.add_argument('clips', nargs='+', help='video files, session recordings or image directories')
+    parser.add_argument('--output-dir', default='results')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes, CPU count by default')
+    parser.add_argument('--chunk-frames', type=int, default=300, help='frames per task')
+    parser.add_argument('--pupil-locator', default=pupil_locator, choices=list(PUPIL_LOCATORS))
+    args = parser.parse_args()
+
+    BatchRunner(args.clips, args.output_dir, args.workers, args.chunk_frames, args.pupil_locator).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+"""Benchmark of the per-frame eye tracking pipeline, runs without camera and GUI.
+
+Usage: python benchmark.py [--input synthetic:300] [--output benchmark.json] [--compare old.json]
+                           [--blink-engine cascade|openness]
+
+A fixed set of frames is loaded into memory first, then replayed through the detection,
+voting, preview composition and rendering stages. Per-stage latency percentiles, end-to-end FPS and
+peak memory are written to a JSON file, --compare reports stages which got slower than
+a previous result file by more than --tolerance. Detected blinks are counted too, on synthetic
+input every blink is known, so blink engines can be compared by cost, missed blinks and false triggers.
+For recordings pass the blinks counted by hand with --expected-blinks. The share of frames in which
+both eyes were found is reported as eyes_found, blink counts of inputs where the eye cascade
+mostly fails (e.g. synthetic input smaller than 640x480) do not compare the engines, the benchmark
+warns about them.
+"""
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import time
+
+import numpy as np
+
+from gaze_events import GazeEventBus
+from preview import PreviewMailbox
+from sources import SyntheticSource, open_source
+from util import TimedCountingQueue, EyeStatusQueue, FrameMailbox
+
+STAGES = ('detect', 'blink', 'direction', 'handle_blink', 'handle_direction', 'compose', 'render')
+
+
+def load_frames(spec: str, limit: int):
+    """Returns list of (timestamp, frame), timestamps drive the time-based voting like in a live session."""
+    frames = []
+    with open_source(spec) as source:
+        for timestamp, frame in source:
+            # Recordings are memory-mapped, the copy keeps them in memory like the other sources
+            frames.append((timestamp, np.array(frame)))
+            if len(frames) >= limit:
+                break
+    return frames
+
+
+# Blink counts are not reported as comparable when both eyes were found in fewer frames
+MIN_EYES_FOUND = 0.5
+
+
+def expected_blinks(spec: str, frames: int):
+    """Blinks completed in the first frames of the input, None when they are not known."""
+    if not str(spec).startswith('synthetic'):
+        return None
+    return SyntheticSource().blinks(frames)
+
+
+def eyes_found(detection) -> bool:
+    return detection is not None and bool(detection.faces) and len(detection.eyes[0]) >= 2
+
+
+def create_tracker(legacy: bool, pupil_locator: str, blink_engine: str):
+    # Only QtCore is needed, no display or QApplication
+    from consts import phrases_file
+    from phrases import PhraseEngine
+    from video_processing import VideoProcessing
+
+    tracker = VideoProcessing(GazeEventBus(), FrameMailbox(), None)
+    # Selections made by the benchmark are not saved to the phrase usage
+    tracker.phrases = PhraseEngine.from_file(phrases_file)
+    tracker.shared_detection = not legacy
+    tracker.set_pupil_locator(pupil_locator)
+    tracker.blink_engine = blink_engine
+    return tracker
+
+
+def run(frames, tracker, repeat: int, preview_size):
+    timings = {stage: [] for stage in STAGES}
+    preview = PreviewMailbox(*preview_size)
+    eye_status_queue = EyeStatusQueue(tracker.voting_window)
+    blink_status_queue = TimedCountingQueue(tracker.blink_window)
+    tracker.last_time_chat_select = frames[0][0] if frames else 0
+
+    def timed(stage, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        timings[stage].append(time.perf_counter() - start)
+        return result
+
+    started = time.perf_counter()
+    count = 0
+    found = 0
+    for repetition in range(repeat):
+        # Every repetition continues the timeline of the previous one
+        time_offset = repetition * (frames[-1][0] - frames[0][0] + 1) if frames else 0
+        for frame_timestamp, frame in frames:
+            timestamp = time_offset + frame_timestamp
+            annotations = []
+            detection = timed('detect', tracker.detector.detect, frame) if tracker.shared_detection else None
+            found += eyes_found(detection)
+            blink = timed('blink', tracker.detect_blink, frame, detection, annotations, timestamp)
+            eye_status = timed('direction', tracker.detect_eyes_direction, True, frame, None, detection, annotations,
+                               timestamp)
+            timed('handle_blink', tracker.handle_blink, frame, blink, blink_status_queue, timestamp)
+            timed('handle_direction', tracker.handle_direction, eye_status, eye_status_queue, timestamp)
+            frame = timed('compose', tracker.compose_preview, frame, annotations)
+            # Same work as PreviewMailbox.put for the GUI: colour conversion and scaling to the preview size
+            timed('render', preview.render, frame, 0, *preview_size)
+            count += 1
+    elapsed = time.perf_counter() - started
+    # Not known with --legacy, which has no shared detection
+    eyes = found / count if count and tracker.shared_detection else None
+    return timings, count, elapsed, tracker.blink_count, eyes
+
+
+def summary(timings, count, elapsed, blinks, expected=None, eyes=None):
+    stages = {}
+    for stage, values in timings.items():
+        if not values:
+            continue
+        values = np.array(values) * 1000
+        stages[stage] = {
+            'mean_ms': float(values.mean()),
+            'p50_ms': float(np.percentile(values, 50)),
+            'p90_ms': float(np.percentile(values, 90)),
+            'p99_ms': float(np.percentile(values, 99)),
+            'max_ms': float(values.max()),
+        }
+    return {
+        'frames': count,
+        'fps': count / elapsed if elapsed else 0,
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'stages': stages,
+        # Share of frames in which both eyes were found
+        'eyes_found': eyes,
+        # Detected blinks, false triggers are the ones over the expected count
+        'blinks': blinks,
+        'expected_blinks': expected,
+        'false_blinks': max(0, blinks - expected) if expected is not None else None,
+        'missed_blinks': max(0, expected - blinks) if expected is not None else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(result: dict, baseline: dict, tolerance: float):
+    """Returns list of regression descriptions, empty when nothing got slower than tolerance."""
+    regressions = []
+    for stage, values in result['stages'].items():
+        old = baseline.get('stages', {}).get(stage)
+        if old and values['p50_ms'] > old['p50_ms'] * (1 + tolerance):
+            regressions.append(f"{stage}: p50 {old['p50_ms']:.3f} -> {values['p50_ms']:.3f} ms")
+    if baseline.get('fps') and result['fps'] < baseline['fps'] * (1 - tolerance):
+        regressions.append(f"fps: {baseline['fps']:.1f} -> {result['fps']:.1f}")
+    return regressions
+
+
+def main():
+    from blink import BLINK_ENGINES
+    from consts import pupil_locator, blink_engine
+    from pupil import PUPIL_LOCATORS
+
+    parser = argparse.ArgumentParser(description='Eye tracking pipeline benchmark')
+    parser.add_argument('--input', default='synthetic:300', help='video file, image directory or synthetic[:frames]')
+    parser.add_argument('--frames', type=int, default=300, help='maximum number of frames loaded')
+    parser.add_argument('--repeat', type=int, default=1, help='how many times the frames are replayed')
+    parser.add_argument('--legacy', action='store_true', help='separate blink and gaze detection passes')
+    parser.add_argument('--pupil-locator', default=pupil_locator, choices=list(PUPIL_LOCATORS))
+    parser.add_argument('--blink-engine', default=blink_engine, choices=list(BLINK_ENGINES))
+    parser.add_argument('--expected-blinks', type=int, default=None,
+                        help='blinks in the loaded frames of a recording, counted by hand')
+    parser.add_argument('--preview-size', type=int, nargs=2, default=(1280, 1024), metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--compare', default=None, help='previous result file')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed slowdown, 0.1 is 10%%')
+    args = parser.parse_args()
+
+    frames = load_frames(args.input, args.frames)
+    tracker = create_tracker(args.legacy, args.pupil_locator, args.blink_engine)
+    timings, count, elapsed, blinks, eyes = run(frames, tracker, args.repeat, tuple(args.preview_size))
+
+    expected = args.expected_blinks if args.expected_blinks is not None else expected_blinks(args.input, len(frames))
+    result = summary(timings, count, elapsed, blinks, expected * args.repeat if expected is not None else None, eyes)
+    result.update({
+        'commit': git_commit(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+    })
+    with open(args.output, 'w') as file:
+        json.dump(result, file, indent=2)
+
+    print(f"{count} frames, {result['fps']:.1f} FPS, peak RSS {result['peak_rss_mb']:.0f} MB")
+    print(f"{blinks} blinks ({args.blink_engine})" + (f", expected {result['expected_blinks']}, "
+                                                       f"missed {result['missed_blinks']}, "
+                                                       f"false {result['false_blinks']}" if expected is not None else ''))
+    if eyes is not None:
+        print(f"eyes found in {eyes:.0%} of the frames")
+        if eyes < MIN_EYES_FOUND:
+            print("WARNING the eye cascade mostly fails on this input, blink counts do not compare the engines")
+    for stage, values in result['stages'].items():
+        print(f"  {stage:17} p50 {values['p50_ms']:7.3f}  p90 {values['p90_ms']:7.3f}  "
+              f"p99 {values['p99_ms']:7.3f} ms")
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(result, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
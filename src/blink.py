@@ -0,0 +1,110 @@
+import time
+
+import cv2
+import numpy as np
+
+from detection import FrameDetection
+
+# 'cascade' is the original detect_eye_blink, 'openness' the OpennessBlinkDetector below
+BLINK_ENGINES = ('cascade', 'openness')
+# Eye boxes as fractions of the face box, used until the eye cascade finds the eyes
+DEFAULT_EYE_BOXES = [(0.15, 0.2, 0.3, 0.25), (0.55, 0.2, 0.3, 0.25)]
+
+
+class OpennessBlinkDetector:
+    """Detects blinks as short dips of an eye openness signal, without another cascade pass.
+
+    Openness is the vertical edge energy of the eye crops already found for gaze tracking
+    (an open eye has strong horizontal iris and eyelid edges), relative to a baseline which
+    follows the open eye over the last baseline_seconds. A blink is a dip below dip_ratio
+    of the baseline lasting between min_duration and max_duration seconds, longer dips are
+    looking away or closed eyes. When the eye cascade loses a closed eye, its last box in
+    the face (or DEFAULT_EYE_BOXES) is used. update() returns True on the frame the eye opens again after a blink.
+    """
+
+    def __init__(self, dip_ratio=0.6, min_duration=0.05, max_duration=0.5, baseline_seconds=3.0,
+                 roi_size=(32, 16)) -> None:
+        self.dip_ratio = dip_ratio
+        self.min_duration = min_duration
+        self.max_duration = max_duration
+        self.baseline_seconds = baseline_seconds
+        self.roi_size = roi_size
+
+        self.baseline = None
+        self.dip_start = None
+        self.last_timestamp = None
+        # Eye boxes of the first face as fractions of the face size
+        self.eye_boxes = DEFAULT_EYE_BOXES
+        self.ratio = None
+
+    def reset(self) -> None:
+        self.baseline = None
+        self.dip_start = None
+        self.last_timestamp = None
+        self.eye_boxes = DEFAULT_EYE_BOXES
+        self.ratio = None
+
+    def openness(self, eye_gray) -> float:
+        small = cv2.resize(eye_gray, self.roi_size, interpolation=cv2.INTER_AREA)
+        return float(np.abs(cv2.Sobel(small, cv2.CV_32F, 0, 1, ksize=3)).mean())
+
+    def eye_crops(self, detection: FrameDetection):
+        face_gray = detection.face_gray(0)
+        face_height, face_width = face_gray.shape[:2]
+        eyes = detection.eyes[0][:2]
+        if eyes:
+            self.eye_boxes = [(x / face_width, y / face_height, w / face_width, h / face_height)
+                              for (x, y, w, h) in eyes]
+        crops = []
+        for (x, y, w, h) in self.eye_boxes:
+            x, w = int(x * face_width), max(1, int(w * face_width))
+            y, h = int(y * face_height), max(1, int(h * face_height))
+            crop = face_gray[y: y + h, x: x + w]
+            if crop.size:
+                crops.append(crop)
+        return crops
+
+    def measure(self, detection: FrameDetection):
+        """Openness of the eyes of the first face, None without a face."""
+        if not detection.faces:
+            return None
+        crops = self.eye_crops(detection)
+        if not crops:
+            return None
+        return float(np.mean([self.openness(crop) for crop in crops]))
+
+    def update(self, detection: FrameDetection, timestamp=None) -> bool:
+        return self.update_value(self.measure(detection), timestamp)
+
+    def update_value(self, value, timestamp=None) -> bool:
+        """Takes the measure() of the next frame, frames have to come in capture order."""
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if value is None:
+            self.dip_start = None
+            return False
+
+        dt = timestamp - self.last_timestamp if self.last_timestamp is not None else 0
+        self.last_timestamp = timestamp
+        if self.baseline is None or self.baseline <= 0:
+            self.baseline = value
+            return False
+
+        self.ratio = value / self.baseline
+        blink = False
+        if self.ratio < self.dip_ratio:
+            if self.dip_start is None:
+                self.dip_start = timestamp
+            elif timestamp - self.dip_start > self.baseline_seconds:
+                # Not a blink but a lasting change (lighting, head pose), start over from the new level
+                self.baseline = value
+                self.dip_start = None
+            return False
+
+        if self.dip_start is not None:
+            blink = self.min_duration <= timestamp - self.dip_start <= self.max_duration
+            self.dip_start = None
+        # Baseline follows the open eye only, it rises ten times faster than it falls, in case it started on closed eyes
+        time_constant = self.baseline_seconds / 10 if value > self.baseline else self.baseline_seconds
+        self.baseline += (1 - np.exp(-dt / time_constant)) * (value - self.baseline)
+        return blink
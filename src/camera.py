@@ -0,0 +1,73 @@
+import time
+from threading import Event, Lock, Thread
+
+import cv2
+
+from consts import camera
+from metrics import metrics
+
+
+class CameraService(Thread):
+    """Owns the camera device for the whole application run and hands every frame to all subscribers.
+
+    Subscribers are called from the capture thread as callback(frame, timestamp) and must not modify the frame,
+    it is shared between all of them. timestamp is time.monotonic() right after the frame was read,
+    the same for every subscriber however long the ones before it take.
+    """
+
+    def __init__(self, camera_index=camera) -> None:
+        super().__init__(daemon=True)
+        self.camera = camera_index
+        self.requested_camera = camera_index
+        self.subscribers = []
+        self.lock = Lock()
+        self.stop_event = Event()
+
+    def subscribe(self, callback) -> None:
+        with self.lock:
+            if callback not in self.subscribers:
+                self.subscribers.append(callback)
+
+    def unsubscribe(self, callback) -> None:
+        with self.lock:
+            if callback in self.subscribers:
+                self.subscribers.remove(callback)
+
+    def set_camera(self, camera_index) -> None:
+        """Switches to another device, it is reopened by the capture thread."""
+        self.requested_camera = camera_index
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    def open(self):
+        cap = cv2.VideoCapture(self.camera)
+        if not cap.isOpened():
+            print("Error opening video stream or file")
+        return cap
+
+    def run(self) -> None:
+        cap = self.open()
+        while not self.stop_event.is_set():
+            if self.requested_camera != self.camera:
+                cap.release()
+                self.camera = self.requested_camera
+                cap = self.open()
+
+            if not cap.isOpened():
+                self.stop_event.wait(0.1)
+                continue
+
+            with metrics.timer('capture'):
+                ret, frame = cap.read()
+            timestamp = time.monotonic()
+            if not ret:
+                self.stop_event.wait(0.01)
+                continue
+            metrics.tick('capture')
+
+            with self.lock:
+                subscribers = list(self.subscribers)
+            for callback in subscribers:
+                callback(frame, timestamp)
+        cap.release()
@@ -0,0 +1,132 @@
+import json
+import os
+import time
+from collections import deque
+from datetime import datetime
+
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, Qt
+
+
+class ChatLog:
+    """Append-only JSON lines log of the selected phrases of one session.
+
+    Writes are buffered and flushed at most every flush_interval seconds (and on flush/close).
+    Byte offsets of all entries are kept, so any range of older entries can be read back.
+    The file is created by the first append(), sessions without any phrase leave no file behind.
+    """
+
+    def __init__(self, path: str, flush_interval=5.0) -> None:
+        self.path = path
+        self.flush_interval = flush_interval
+
+        self.offsets = []
+        if os.path.exists(path):
+            with open(path, 'rb') as file:
+                offset = 0
+                for line in file:
+                    self.offsets.append(offset)
+                    offset += len(line)
+        self.file = None
+        self.last_flush = time.monotonic()
+
+    def open(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(self.path, 'ab')
+
+    @classmethod
+    def for_session(cls, directory: str, flush_interval=5.0):
+        name = datetime.now().strftime('session-%Y%m%d-%H%M%S.jsonl')
+        return cls(os.path.join(directory, name), flush_interval)
+
+    def append(self, time_text: str, text: str) -> None:
+        if self.file is None:
+            self.open()
+        self.offsets.append(self.file.tell())
+        self.file.write((json.dumps({'time': time_text, 'text': text}) + '\n').encode())
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.file is not None:
+            self.file.flush()
+        self.last_flush = time.monotonic()
+
+    def read(self, start: int, end: int):
+        """Returns (time, text) of entries start..end-1, oldest first."""
+        if start >= end:
+            return []
+        self.flush()
+        entries = []
+        with open(self.path, 'rb') as file:
+            file.seek(self.offsets[start])
+            for _ in range(end - start):
+                entry = json.loads(file.readline())
+                entries.append((entry['time'], entry['text']))
+        return entries
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+
+class ChatHistoryModel(QAbstractListModel):
+    """Newest-first list of selected phrases for a QListView.
+
+    Only the newest `capacity` rows are kept in memory, a new phrase inserts a single row.
+    Older entries are read back from the log page by page when the view scrolls to the end,
+    once the user scrolled back that far nothing is trimmed anymore, so the rows they read stay.
+    """
+
+    def __init__(self, log: ChatLog, capacity=200, page_size=50, parent=None) -> None:
+        super().__init__(parent)
+        self.log = log
+        self.capacity = capacity
+        self.page_size = page_size
+        # (time, text), newest first
+        self.rows = deque()
+        # Log index of the oldest row in memory, everything before it is only on disk
+        self.oldest_index = len(log)
+        # Rows read back from the log by fetchMore()
+        self.fetched = 0
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        time_text, text = self.rows[index.row()]
+        return f"{time_text}:\t{text}"
+
+    def add(self, text: str, time_text: str) -> None:
+        self.log.append(time_text, text)
+        self.beginInsertRows(QModelIndex(), 0, 0)
+        self.rows.appendleft((time_text, text))
+        self.endInsertRows()
+
+        if not self.fetched and len(self.rows) > self.capacity:
+            self.beginRemoveRows(QModelIndex(), self.capacity, len(self.rows) - 1)
+            while len(self.rows) > self.capacity:
+                self.rows.pop()
+                self.oldest_index += 1
+            self.endRemoveRows()
+
+    def canFetchMore(self, parent=QModelIndex()) -> bool:
+        return not parent.isValid() and self.oldest_index > 0
+
+    def fetchMore(self, parent=QModelIndex()) -> None:
+        count = min(self.page_size, self.oldest_index)
+        if parent.isValid() or count == 0:
+            return
+        entries = self.log.read(self.oldest_index - count, self.oldest_index)
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + count - 1)
+        self.rows.extend(reversed(entries))
+        self.oldest_index -= count
+        self.fetched += count
+        self.endInsertRows()
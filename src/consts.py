@@ -1 +1,64 @@
-camera = 0
\ No newline at end of file
+import os
+
+camera = 0
+# Haar cascades directory, independent of the working directory
+resources_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'resources')
+# Preview refresh rate cap, frames that come faster are dropped
+max_display_fps = 30
+# Pupil locator used by the eye tracker, 'hough' or 'blob'
+pupil_locator = 'hough'
+# Instrumentation: overlay refresh interval in seconds, metrics dump file (.jsonl for JSON lines,
+# anything else for text) with its interval, cProfile output of the eye tracking thread
+metrics_interval = 1.0
+metrics_file = None
+metrics_dump_interval = 10.0
+profile_file = None
+# Adaptive quality: detection is made cheaper when a frame takes longer than 1 / target_fps
+# or latency_budget seconds, None disables the budget
+adaptive_quality = True
+target_fps = 15
+latency_budget = None
+# Skip detection and reuse the last result while the camera image does not change
+motion_gating = True
+# Detector processes of the capture/detect pipeline (pipeline.py) and its shared frame slots,
+# 0 workers runs detection in the eye tracking thread
+pipeline_workers = 0
+pipeline_slots = 8
+# Gaze timing in milliseconds, independent of the camera frame rate: eye direction and blink vote windows,
+# pause after a chat message is selected and how long a direction has to be held to scroll
+voting_window_ms = 600
+blink_window_ms = 600
+chat_select_cooldown_ms = 3000
+scroll_dwell_ms = 400
+# Gaze events waiting for the Scroller, the oldest are dropped when it falls behind,
+# scroll requests coming faster than scroll_min_interval_ms are merged into one
+gaze_event_capacity = 64
+scroll_min_interval_ms = 100
+# Chat history: phrases kept in the on-screen list, older ones are read back from the session log on scrolling
+chat_history_capacity = 200
+chat_log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'chat_logs')
+chat_log_flush_interval = 5.0
+# Phrase engine (phrases.py): phrases navigated by gaze, one per line, and the persisted usage counts which bring
+# frequent phrases closer to the first screen. Opening a group of phrases is followed by a shorter pause
+# than selecting a phrase.
+phrases_file = os.path.join(resources_dir, 'phrases.txt')
+phrase_usage_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'phrase_usage.json')
+phrase_step_cooldown_ms = 1000
+# Startup budgets in seconds: from launch to the first camera frame, and for importing app (startup_report.py)
+startup_budget = 3.0
+import_budget = 1.0
+# Session recordings made with the 'Record session' checkbox, 'png' is lossless and smaller, 'raw' is the fastest
+recordings_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'recordings')
+recording_codec = 'png'
+# Gaze smoothing: 'one_euro' or 'kalman' filter of the pupil offset of each eye (parameters of the filter class
+# in smoothing.py), classified with hysteresis. None classifies every frame on its own. Smoothed labels are
+# stable enough for a shorter eye direction vote window.
+gaze_smoothing = 'one_euro'
+gaze_filter_parameters = {'min_cutoff': 1.0, 'beta': 0.05}
+gaze_enter_ratio = 1.5
+gaze_hysteresis_degrees = 10
+smoothed_voting_window_ms = 250
+# Blink engine: 'cascade' votes on frames without two large eyes over blink_window_ms, 'openness' detects short
+# dips of the eye openness on the eye crops of gaze tracking (blink.py), parameters of OpennessBlinkDetector
+blink_engine = 'cascade'
+openness_blink_parameters = {'dip_ratio': 0.6, 'min_duration': 0.05, 'max_duration': 0.5, 'baseline_seconds': 3.0}
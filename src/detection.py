@@ -0,0 +1,98 @@
+import cv2
+
+from tracking import FaceTracker
+from metrics import metrics
+
+
+class FrameDetection:
+    """Result of a single detection pass over one frame, shared by blink and gaze detection."""
+
+    def __init__(self, gray, faces, eyes, eye_rois) -> None:
+        self.gray = gray
+        # (x, y, w, h) of every face, in frame coordinates
+        self.faces = faces
+        # for every face: list of (x, y, w, h) eye boxes in face coordinates, sorted by y
+        self.eyes = eyes
+        # for every face: list of grayscale eye crops matching self.eyes
+        self.eye_rois = eye_rois
+
+    def face_gray(self, face_index: int):
+        x, y, w, h = self.faces[face_index]
+        return self.gray[y: y + h, x: x + w]
+
+
+class FrameDetector:
+    def __init__(self, face_cascade, eye_cascade,
+                 face_scale_factor=1.1, face_min_neighbors=4, tracker: FaceTracker = None,
+                 face_detection_width=None, eye_detection_width=None) -> None:
+        self.face_cascade = face_cascade
+        self.eye_cascade = eye_cascade
+        self.face_scale_factor = face_scale_factor
+        self.face_min_neighbors = face_min_neighbors
+        # Detection pyramid: faces are searched on the frame downscaled to face_detection_width,
+        # eyes on the face crop downscaled to eye_detection_width. None means full resolution.
+        # Boxes are always returned in full resolution coordinates.
+        self.face_detection_width = face_detection_width
+        self.eye_detection_width = eye_detection_width
+        # Optional tracker, when set the face cascade is not run on every frame
+        self.tracker = tracker
+
+    def detect_faces(self, gray):
+        small, scale_x, scale_y = downscale(gray, self.face_detection_width)
+        faces = self.face_cascade.detectMultiScale(small, self.face_scale_factor, self.face_min_neighbors)
+        return scale_boxes(faces, scale_x, scale_y)
+
+    def detect_eyes(self, face_gray):
+        small, scale_x, scale_y = downscale(face_gray, self.eye_detection_width)
+        detected_eyes = scale_boxes(self.eye_cascade.detectMultiScale(small), scale_x, scale_y)
+        return sorted(detected_eyes, key=lambda el: el[1])
+
+    def locate_faces(self, gray):
+        if self.tracker is None:
+            return self.detect_faces(gray)
+
+        if not self.tracker.needs_detection():
+            faces = self.tracker.track(gray)
+            if faces is not None:
+                return faces
+
+        faces = self.detect_faces(gray)
+        self.tracker.reset(gray, faces)
+        return faces
+
+    def detect(self, frame) -> FrameDetection:
+        with metrics.timer('grayscale'):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        with metrics.timer('face_cascade'):
+            faces = [tuple(face) for face in self.locate_faces(gray)]
+        if not faces:
+            metrics.count('no_face')
+
+        eyes = []
+        eye_rois = []
+        for (x_face, y_face, width_face, height_face) in faces:
+            face_gray = gray[y_face: y_face + height_face, x_face: x_face + width_face]
+            with metrics.timer('eye_cascade'):
+                face_eyes = [tuple(eye) for eye in self.detect_eyes(face_gray)]
+            eyes.append(face_eyes)
+            eye_rois.append([face_gray[eye_y: eye_y + eye_h, eye_x: eye_x + eye_w]
+                             for (eye_x, eye_y, eye_w, eye_h) in face_eyes])
+
+        return FrameDetection(gray, faces, eyes, eye_rois)
+
+
+def downscale(image, width):
+    """Returns image resized to given width and the x, y factors mapping it back to the original."""
+    height_orig, width_orig = image.shape[:2]
+    if width is None or width >= width_orig:
+        return image, 1, 1
+    height = max(1, int(round(height_orig * width / width_orig)))
+    small = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+    return small, width_orig / width, height_orig / height
+
+
+def scale_boxes(boxes, scale_x, scale_y):
+    if scale_x == 1 and scale_y == 1:
+        return [tuple(int(v) for v in box) for box in boxes]
+    return [(int(round(x * scale_x)), int(round(y * scale_y)), int(round(w * scale_x)), int(round(h * scale_y)))
+            for (x, y, w, h) in boxes]
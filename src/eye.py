@@ -1,5 +1,4 @@
 from enum import Enum
-from turtle import position
 
 
 class Direction(Enum):
@@ -25,22 +24,7 @@ class Eye:
         self.eye_position = position
 
     def get_direction(self) -> Direction:
-        x_current, y_current = self.eye_position
-        x_start, y_start = self.starting_position
+        from iris import classify_positions
 
         # print(self.starting_position, self.eye_position)
-        if (x_current + self.middle_block[0] > x_start > x_current - self.middle_block[0] and
-                y_current + self.middle_block[1] > y_start > y_current - self.middle_block[1]):
-            return Direction.MIDDLE
-
-        elif y_start >= y_current + self.middle_block[1]:
-            return Direction.UP
-
-        elif y_start <= y_current - self.middle_block[1]:
-            return Direction.DOWN
-
-        elif x_start >= x_current + self.middle_block[0]:
-            return Direction.RIGHT
-
-        elif x_start <= x_current - self.middle_block[0]:
-            return Direction.LEFT
+        return classify_positions(self.eye_position, self.starting_position, self.middle_block)[0]
@@ -0,0 +1,312 @@
+import time
+
+import cv2
+
+from eye import Eye
+from iris import classify_iris
+from pupil import PUPIL_LOCATORS, create_pupil_locator
+from smoothing import EyeSmoother
+from blink import OpennessBlinkDetector
+from consts import pupil_locator, motion_gating, gaze_smoothing, gaze_filter_parameters, \
+    gaze_enter_ratio, gaze_hysteresis_degrees, blink_engine, openness_blink_parameters
+from models import get_cascade
+from detection import FrameDetection, FrameDetector
+from tracking import FaceTracker
+from motion import MotionGate
+from overlay import Circle, Rectangle
+from metrics import metrics
+
+
+class GazeDetector:
+    """Per-frame blink and eye direction detection, independent of Qt so it can run in worker processes."""
+
+    def __init__(self) -> None:
+        # Shared by all detectors of the process, loaded once
+        self.face_cascade = get_cascade('face')
+        self.eye_cascade = get_cascade('eye')
+
+        # Pupil locators by name, 'hough' is the original HoughCircles one
+        self.pupil_locators = {name: create_pupil_locator(name) for name in PUPIL_LOCATORS}
+        self.pupil_locator = self.pupil_locators[pupil_locator]
+        # Set by lower quality levels, the blob locator is used regardless of the selected one
+        self.fast_pupil = False
+
+        self.FACTOR = 0.015
+        # Iris position tracker
+        self.iris_min_dist = 2
+        # Hough radii and distances are tuned for frames of this width
+        # and are scaled for other camera resolutions
+        self.reference_width = 640
+
+        # Single face/eye cascade pass per frame shared by blink and gaze detection.
+        # Set to False to get the old behaviour with separate passes for each of them.
+        self.shared_detection = True
+        # Detect-then-track: full face cascade every redetect_interval frames or after tracking is lost,
+        # otherwise the face is searched in its last box expanded by track_margin on every side.
+        self.track_faces = True
+        self.redetect_interval = 10
+        self.track_margin = 0.25
+        self.face_tracker = FaceTracker(self.redetect_interval, self.track_margin)
+        # Detection pyramid: faces on a frame downscaled to this width, eyes on a face crop downscaled
+        # to this width, Hough on the full resolution eye crop. None disables downscaling.
+        self.face_detection_width = 320
+        self.eye_detection_width = 240
+        self.detector = FrameDetector(self.face_cascade, self.eye_cascade,
+                                      tracker=self.face_tracker if self.track_faces else None,
+                                      face_detection_width=self.face_detection_width,
+                                      eye_detection_width=self.eye_detection_width)
+        # Blink minimal sizes, same as in the separate blink pass
+        self.blink_min_face_size = 200
+        self.blink_min_eye_size = 50
+        # Blink is checked every blink_interval frames of detect(), the last result is reused in between
+        self.blink_interval = 1
+        self.frames_since_blink = 0
+        self.last_blink = False
+        # 'cascade' reports closed eyes on every frame, 'openness' reports a blink once, on the frame the eyes
+        # open again (see blink.py). 'openness' needs shared_detection, it falls back to 'cascade' without it.
+        self.blink_engine = blink_engine
+        self.blink_detector = OpennessBlinkDetector(**openness_blink_parameters)
+        # Motion gating: when the frame barely differs from the last detected one,
+        # detection is skipped and its last result is returned again
+        self.motion_gate = MotionGate() if motion_gating else None
+        self.last_eye_status = {'Left': None, 'Right': None}
+        self.last_annotations = []
+        # Temporal smoothing of the pupil offset of each eye, classified with hysteresis, None uses raw labels
+        self.eye_smoothers = None
+        if gaze_smoothing:
+            self.eye_smoothers = {eye: EyeSmoother(gaze_smoothing, gaze_filter_parameters, gaze_enter_ratio,
+                                                   gaze_hysteresis_degrees)
+                                  for eye in ('Left', 'Right')}
+        # Inputs of the temporal state from the last detected frame, see measurements(): pupil offsets
+        # from the eye centres in reference resolution pixels and the eye openness
+        self.eye_offsets = {'Left': None, 'Right': None}
+        self.last_openness = None
+        # Set by make_stateless()
+        self.stateless = False
+
+    def make_stateless(self) -> None:
+        """For pipeline workers, which get every Nth frame only.
+
+        No face tracking, motion gating, gaze smoothing or blink dips, these need every frame in order.
+        measurements() of each frame go to apply_temporal_state() of a single consumer instead.
+        """
+        self.stateless = True
+        self.track_faces = False
+        self.detector.tracker = None
+        self.motion_gate = None
+        self.eye_smoothers = None
+
+    def measurements(self):
+        """(eye offsets, openness) of the last detected frame, for apply_temporal_state()."""
+        return dict(self.eye_offsets), self.last_openness
+
+    def apply_temporal_state(self, blink, eye_status, measurements, timestamp):
+        """Returns (blink, eye_status) of a stateless detection with this detector's smoothing and blink dips."""
+        eye_offsets, openness = measurements
+        if self.temporal_blink():
+            blink = self.blink_detector.update_value(openness, timestamp)
+        if self.eye_smoothers is not None:
+            eye_status = dict(eye_status)
+            for eye, offset in eye_offsets.items():
+                if offset is not None:
+                    _, eye_status[eye] = self.eye_smoothers[eye].update(offset, timestamp, self.iris_min_dist)
+        return blink, eye_status
+
+    def set_pupil_locator(self, name: str):
+        self.pupil_locator = self.pupil_locators[name]
+
+    def set_quality(self, level) -> None:
+        """Applies a quality.QualityLevel."""
+        self.face_detection_width = self.detector.face_detection_width = level.face_detection_width
+        self.eye_detection_width = self.detector.eye_detection_width = level.eye_detection_width
+        self.redetect_interval = self.face_tracker.redetect_interval = level.redetect_interval
+        self.fast_pupil = level.fast_pupil
+        self.blink_interval = level.blink_interval
+
+    def detect(self, frame, annotations: list = None, timestamp=None):
+        """Returns (blink, eye_status) for one frame, debug drawings are appended to annotations when given.
+
+        timestamp is the capture time in seconds used by the gaze smoothing and motion gate, time.monotonic() by default.
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if self.motion_gate is not None and not self.motion_gate.changed(frame, timestamp):
+            metrics.count('motion_reused')
+            if self.eye_smoothers is not None:
+                # Otherwise the next detection, max_reuse_seconds later, looks like the eyes were lost
+                for eye, smoother in self.eye_smoothers.items():
+                    if self.last_eye_status.get(eye) is not None:
+                        smoother.keep_alive(timestamp)
+            if annotations is not None:
+                annotations.extend(self.last_annotations)
+            # A blink event is reported only once
+            return self.last_blink and not self.temporal_blink(), dict(self.last_eye_status)
+
+        # Kept for frames on which the motion gate reuses this result
+        frame_annotations = [] if annotations is not None or self.motion_gate is not None else None
+
+        self.frames_since_blink += 1
+        # The openness signal is cheap and has to be sampled on every frame
+        check_blink = self.frames_since_blink >= self.blink_interval or self.temporal_blink()
+        if check_blink:
+            self.frames_since_blink = 0
+
+        if self.shared_detection:
+            detection = self.detector.detect(frame)
+            if check_blink:
+                self.last_blink = self.detect_blink(frame, detection, frame_annotations, timestamp)
+            eye_status = self.detect_eyes_direction(True, frame, None, detection, frame_annotations, timestamp)
+            boxes = detection_boxes(detection)
+        else:
+            if check_blink:
+                self.last_blink = self.detect_eye_blink(True, frame, annotations=frame_annotations)
+            eye_status = self.detect_eyes_direction(True, frame, None, annotations=frame_annotations,
+                                                    timestamp=timestamp)
+            boxes = []
+
+        if self.motion_gate is not None:
+            self.motion_gate.update(boxes, timestamp)
+            self.last_annotations = frame_annotations
+        if annotations is not None:
+            annotations.extend(frame_annotations)
+        self.last_eye_status = eye_status
+        return self.last_blink, eye_status
+
+    def temporal_blink(self) -> bool:
+        return self.blink_engine == 'openness' and self.shared_detection
+
+    def detect_blink(self, frame, detection: FrameDetection = None, annotations: list = None, timestamp=None) -> bool:
+        """Blink detection of the selected blink_engine."""
+        with metrics.timer('blink'):
+            if detection is not None and self.blink_engine == 'openness':
+                if self.stateless:
+                    self.last_openness = self.blink_detector.measure(detection)
+                    return False
+                return self.blink_detector.update(detection, timestamp)
+            return self.detect_eye_blink(True, frame, detection, annotations)
+
+    def detect_eyes_direction(self, ret, frame, eye_status_queue, detection: FrameDetection = None,
+                              annotations: list = None, timestamp=None):
+
+        eye_status = {'Left': None,
+                      'Right': None}  # Tracker for eye status
+        self.eye_offsets = {'Left': None, 'Right': None}
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        frame_height, frame_width = len(frame), len(frame[0])
+        resolution_scale = frame_width / self.reference_width
+        if detection is None:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            faces = self.face_cascade.detectMultiScale(gray, 1.1, 4)
+        else:
+            gray = detection.gray
+            faces = detection.faces
+
+        for face_index, (x_face, y_face, width_face, height_face) in enumerate(faces):
+            face_gray = gray[y_face: y_face + height_face, x_face: x_face + width_face]
+
+            if detection is None:
+                detected_eyes = self.eye_cascade.detectMultiScale(face_gray)
+                detected_eyes = sorted(detected_eyes, key=lambda el: el[1])
+            else:
+                detected_eyes = detection.eyes[face_index]
+            if len(detected_eyes) < 2:
+                metrics.count('eyes_missing')
+
+            # TODO consider breaking if i >= 2 (more than 2 eye detected)
+            for i, (eye_x, eye_y, eye_width, eye_height) in enumerate(
+                    detected_eyes[:2 if len(detected_eyes) > 2 else len(detected_eyes)]):
+
+                if annotations is not None:
+                    annotations.append(Rectangle((x_face + eye_x, y_face + eye_y),
+                                                 (x_face + eye_x + eye_width, y_face + eye_y + eye_height),
+                                                 (0, 255, 0),
+                                                 2))
+
+                eye = Eye(face_gray[eye_y: eye_y + eye_height, eye_x: eye_x + eye_width],
+                          middle_block=(int(self.FACTOR * frame_width), int(self.FACTOR * frame_height)))
+
+                ey, ex = eye.get_center_of_frame()
+
+                # Center of Hough eye
+                if annotations is not None:
+                    annotations.append(Circle((x_face + eye_x + ex, y_face + eye_y + ey), 2, (0, 255, 0), -1))
+
+                # Crop eye
+                eye_frame = face_gray[eye_y: eye_y + eye_height, eye_x: eye_x + eye_width]
+                locator = self.pupil_locators['blob'] if self.fast_pupil else self.pupil_locator
+                with metrics.timer('pupil'):
+                    circles = locator.locate(eye_frame, resolution_scale)
+
+                if circles is not None:
+                    # Circle closest to middle of rectangle, its distance and direction.
+                    closest_circle, dist, direction = classify_iris(circles, (ex, ey),
+                                                                    self.iris_min_dist * resolution_scale)
+
+                    # Print closest circle.
+                    if annotations is not None:
+                        center = (x_face + eye_x + int(closest_circle[0]), y_face + eye_y + int(closest_circle[1]))
+                        annotations.append(Circle(center, 2, (255, 0, 0), -1))
+                        annotations.append(Circle(center, int(closest_circle[2]), (255, 0, 0), 1))
+
+                    # Set status of eye position tracker.
+                    if i == 0:
+                        eye_ = 'Left'
+                    else:
+                        eye_ = "Right"
+                    # Offsets in reference resolution pixels, so filter parameters do not depend on the camera
+                    offset = ((closest_circle[0] - ex) / resolution_scale,
+                              (closest_circle[1] - ey) / resolution_scale)
+                    self.eye_offsets[eye_] = offset
+                    if self.eye_smoothers is not None:
+                        _, direction = self.eye_smoothers[eye_].update(offset, timestamp, self.iris_min_dist)
+                    eye_status[eye_] = direction
+        # TODO get status from here
+        # print(f'Eyes status {eye_status}')
+        return eye_status
+
+    def detect_eye_blink(self, ret, image, detection: FrameDetection = None, annotations: list = None) -> bool:
+        if detection is not None:
+            return self.detect_eye_blink_shared(image, detection, annotations)
+
+        result = False
+
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        gray = cv2.bilateralFilter(gray, 5, 1, 1)
+
+        faces = self.face_cascade.detectMultiScale(gray, 1.3, 5, minSize=(200, 200))
+        if (len(faces) > 0):
+            for (x, y, w, h) in faces:
+                if annotations is not None:
+                    annotations.append(Rectangle((x, y), (x + w, y + h), (0, 255, 0), 2))
+
+                roi_face = gray[y:y + h, x:x + w]
+                eyes = self.eye_cascade.detectMultiScale(roi_face, 1.3, 5, minSize=(50, 50))
+
+                if (len(eyes) >= 2):
+                    result = False
+                else:
+                    result = True
+        return result
+
+    def detect_eye_blink_shared(self, image, detection: FrameDetection, annotations: list = None) -> bool:
+        result = False
+        for face_index, (x, y, w, h) in enumerate(detection.faces):
+            if w < self.blink_min_face_size or h < self.blink_min_face_size:
+                continue
+            if annotations is not None:
+                annotations.append(Rectangle((x, y), (x + w, y + h), (0, 255, 0), 2))
+
+            eyes = [(eye_x, eye_y, eye_w, eye_h) for (eye_x, eye_y, eye_w, eye_h) in detection.eyes[face_index]
+                    if eye_w >= self.blink_min_eye_size and eye_h >= self.blink_min_eye_size]
+            result = len(eyes) < 2
+        return result
+
+
+def detection_boxes(detection: FrameDetection):
+    """Face boxes and eye boxes of a detection, all in frame coordinates."""
+    boxes = list(detection.faces)
+    for (x_face, y_face, _, _), eyes in zip(detection.faces, detection.eyes):
+        boxes += [(x_face + eye_x, y_face + eye_y, eye_w, eye_h) for (eye_x, eye_y, eye_w, eye_h) in eyes]
+    return boxes
@@ -0,0 +1,84 @@
+from collections import deque
+from threading import Condition
+from time import monotonic
+
+from eye import Direction
+
+# Eye status labels (see iris.LABELS) to directions, left and right are already mirrored there
+LABEL_DIRECTIONS = {
+    'Mid': Direction.MIDDLE,
+    'Up': Direction.UP,
+    'Down': Direction.DOWN,
+    'Left': Direction.LEFT,
+    'Right': Direction.RIGHT,
+}
+
+# Put by GazeEventBus.close(), consumers stop when they get it
+SHUTDOWN = object()
+
+
+class GazeEvent:
+    """Gaze directions of both eyes in one frame, None for an eye which was not found."""
+    __slots__ = ('timestamp', 'left', 'right')
+
+    def __init__(self, timestamp: float, left: Direction, right: Direction) -> None:
+        self.timestamp = timestamp
+        self.left = left
+        self.right = right
+
+    @classmethod
+    def from_eye_status(cls, eye_status: dict, timestamp=None):
+        if timestamp is None:
+            timestamp = monotonic()
+        return cls(timestamp, LABEL_DIRECTIONS.get(eye_status['Left']), LABEL_DIRECTIONS.get(eye_status['Right']))
+
+    @property
+    def directions(self):
+        return self.left, self.right
+
+    def __repr__(self) -> str:
+        return f'GazeEvent({self.timestamp:.3f}, {self.left}, {self.right})'
+
+
+class GazeEventBus:
+    """Bounded queue of gaze events from the eye tracker to its consumers.
+
+    put never blocks the eye tracker, when the queue is full the oldest event is dropped.
+    close() puts SHUTDOWN after the pending events, it is never dropped.
+    """
+
+    def __init__(self, capacity=64) -> None:
+        self.capacity = capacity
+        self.events = deque()
+        self.ready = Condition()
+        self.closed = False
+        self.dropped = 0
+
+    def put(self, event: GazeEvent) -> None:
+        with self.ready:
+            if self.closed:
+                return
+            if len(self.events) >= self.capacity:
+                self.events.popleft()
+                self.dropped += 1
+            self.events.append(event)
+            self.ready.notify()
+
+    def get(self, timeout=None):
+        """Returns the oldest event, SHUTDOWN after close(), or None when nothing came within timeout."""
+        with self.ready:
+            if not self.events:
+                self.ready.wait(timeout)
+            if not self.events:
+                return None
+            return self.events.popleft()
+
+    def close(self) -> None:
+        with self.ready:
+            if not self.closed:
+                self.closed = True
+                self.events.append(SHUTDOWN)
+                self.ready.notify_all()
+
+    def __len__(self) -> int:
+        return len(self.events)
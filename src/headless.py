@@ -0,0 +1,78 @@
+"""Runs blink and gaze detection over recorded input without Qt or pyautogui.
+
+Usage: python headless.py INPUT [--output results.jsonl|results.csv] [--pupil-locator hough|blob]
+
+INPUT is a camera index, video file, image directory, session recording (.aocrec) or 'synthetic[:frames]'.
+Frames are processed as fast as possible, results are written one row per frame.
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+
+from consts import pupil_locator
+from gaze import GazeDetector
+from pupil import PUPIL_LOCATORS
+from sources import FrameSource, open_source
+
+FIELDS = ('frame', 'timestamp', 'blink', 'left', 'right')
+
+
+class ResultWriter:
+    """Writes per-frame results as JSON lines or, for a .csv path, as CSV."""
+
+    def __init__(self, output: str) -> None:
+        self.file = open(output, 'w', newline='')
+        self.csv = None
+        if output.lower().endswith('.csv'):
+            self.csv = csv.DictWriter(self.file, fieldnames=FIELDS)
+            self.csv.writeheader()
+
+    def write(self, row: dict) -> None:
+        if self.csv is not None:
+            self.csv.writerow(row)
+        else:
+            self.file.write(json.dumps(row) + '\n')
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def result_row(frame_number: int, timestamp: float, blink: bool, eye_status: dict) -> dict:
+    return {'frame': frame_number, 'timestamp': round(timestamp, 4), 'blink': blink,
+            'left': eye_status['Left'], 'right': eye_status['Right']}
+
+
+def process(source: FrameSource, detector: GazeDetector, writer: ResultWriter) -> int:
+    frame_number = 0
+    for timestamp, frame in source:
+        blink, eye_status = detector.detect(frame, None, timestamp)
+        writer.write(result_row(frame_number, timestamp, blink, eye_status))
+        frame_number += 1
+    return frame_number
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless eye tracking')
+    parser.add_argument('input', help="camera index, video file, image directory or 'synthetic[:frames]'")
+    parser.add_argument('--output', default='results.jsonl', help='.jsonl or .csv file')
+    parser.add_argument('--pupil-locator', default=pupil_locator, choices=list(PUPIL_LOCATORS))
+    parser.add_argument('--realtime', action='store_true', help='replay session recordings with their original timing')
+    args = parser.parse_args()
+
+    detector = GazeDetector()
+    detector.set_pupil_locator(args.pupil_locator)
+    writer = ResultWriter(args.output)
+
+    start = time.perf_counter()
+    with open_source(args.input, args.realtime) as source:
+        frames = process(source, detector, writer)
+    writer.close()
+    elapsed = time.perf_counter() - start
+    print(f"Processed {frames} frames in {elapsed:.2f}s ({frames / elapsed if elapsed else 0:.1f} FPS)",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import numpy as np
+
+from eye import Direction
+
+# Labels of the eye status, the image is mirrored, that's why left and right are switched
+MID, UP, DOWN, LEFT, RIGHT = 'Mid', 'Up', 'Down', 'Left', 'Right'
+LABELS = np.array([MID, LEFT, UP, RIGHT, DOWN], dtype=object)
+
+
+def closest_circles(circles, centres):
+    """Finds the circle closest to every centre.
+
+    circles: (N, 3) array of x, y, r, centres: (M, 2) array of x, y.
+    Returns indices of the closest circles and their distances, both of shape (M,).
+    """
+    circles = np.asarray(circles, dtype=np.float64).reshape(-1, 3)
+    centres = np.asarray(centres, dtype=np.float64).reshape(-1, 2)
+    distances = np.hypot(circles[None, :, 0] - centres[:, None, 0], circles[None, :, 1] - centres[:, None, 1])
+    indices = np.argmin(distances, axis=1)
+    return indices, distances[np.arange(len(centres)), indices]
+
+
+def classify_offsets(dx, dy, min_dist):
+    """Turns iris offsets from the eye centre (y pointing down) into 'Up/Down/Left/Right/Mid' labels."""
+    dx = np.asarray(dx, dtype=np.float64)
+    dy = np.asarray(dy, dtype=np.float64)
+    angle = np.degrees(np.arctan2(-dy, dx))
+    # Angles exactly on the sector borders are 'Mid', same as for a too small distance
+    conditions = [(angle > -45) & (angle < 45),
+                  (angle > 45) & (angle < 135),
+                  (angle > 135) | (angle < -135),
+                  (angle > -135) & (angle < -45)]
+    sector = np.select(conditions, [1, 2, 3, 4], default=0)
+    sector = np.where(np.hypot(dx, dy) <= min_dist, 0, sector)
+    return LABELS[sector]
+
+
+def classify_iris(circles, centre, min_dist):
+    """Returns (closest circle as x, y, r, its distance from the centre, direction label) for one eye."""
+    circles = np.asarray(circles, dtype=np.float64).reshape(-1, 3)
+    indices, distances = closest_circles(circles, centre)
+    circle = circles[indices[0]]
+    label = classify_offsets(circle[0] - centre[0], circle[1] - centre[1], min_dist)
+    return circle, distances[0], label
+
+
+def classify_positions(eye_positions, starting_positions, middle_block):
+    """Vectorised Eye.get_direction for a batch of eye and starting positions, returns Direction values."""
+    eye_positions = np.asarray(eye_positions).reshape(-1, 2)
+    starting_positions = np.asarray(starting_positions).reshape(-1, 2)
+    x_current, y_current = eye_positions[:, 0], eye_positions[:, 1]
+    x_start, y_start = starting_positions[:, 0], starting_positions[:, 1]
+    block_x, block_y = middle_block
+
+    conditions = [(x_current + block_x > x_start) & (x_start > x_current - block_x) &
+                  (y_current + block_y > y_start) & (y_start > y_current - block_y),
+                  y_start >= y_current + block_y,
+                  y_start <= y_current - block_y,
+                  x_start >= x_current + block_x,
+                  x_start <= x_current - block_x]
+    choices = [Direction.MIDDLE, Direction.UP, Direction.DOWN, Direction.RIGHT, Direction.LEFT]
+    return np.select(conditions, np.array(choices, dtype=object), default=None)
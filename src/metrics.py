@@ -0,0 +1,152 @@
+import json
+from collections import deque
+from threading import Event, Lock, Thread
+from time import monotonic, perf_counter
+
+import numpy as np
+
+# Histogram bucket upper bounds in milliseconds
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, float('inf'))
+
+
+class StageTimer:
+    __slots__ = ('metrics', 'stage', 'start')
+
+    def __init__(self, metrics, stage: str) -> None:
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.metrics.record(self.stage, perf_counter() - self.start)
+
+
+class Metrics:
+    """Rolling per-stage timings, counters, event rates and gauges.
+
+    Every stage keeps its last `window` samples, rates are computed from the event times of the
+    last `rate_window` seconds. Each process has its own instance, see `metrics` below.
+    """
+
+    def __init__(self, window=300, rate_window=5.0) -> None:
+        self.window = window
+        self.rate_window = rate_window
+        self.lock = Lock()
+        self.samples = {}
+        self.counters = {}
+        self.events = {}
+        self.gauges = {}
+
+    def timer(self, stage: str) -> StageTimer:
+        return StageTimer(self, stage)
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self.lock:
+            samples = self.samples.get(stage)
+            if samples is None:
+                samples = self.samples[stage] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def count(self, name: str, value=1) -> None:
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def tick(self, name: str) -> None:
+        now = monotonic()
+        with self.lock:
+            events = self.events.get(name)
+            if events is None:
+                events = self.events[name] = deque()
+            events.append(now)
+            while events and events[0] < now - self.rate_window:
+                events.popleft()
+
+    def rate(self, name: str) -> float:
+        """Events per second of the last rate_window seconds."""
+        now = monotonic()
+        with self.lock:
+            events = self.events.get(name)
+            if not events:
+                return 0.0
+            recent = [t for t in events if t >= now - self.rate_window]
+        if len(recent) < 2:
+            return 0.0
+        return (len(recent) - 1) / (recent[-1] - recent[0]) if recent[-1] > recent[0] else 0.0
+
+    def gauge(self, name: str, function) -> None:
+        """Registers a function whose value is read at every snapshot, e.g. dropped frames of a mailbox."""
+        with self.lock:
+            self.gauges[name] = function
+
+    def remove_gauge(self, name: str) -> None:
+        with self.lock:
+            self.gauges.pop(name, None)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.samples.clear()
+            self.counters.clear()
+            self.events.clear()
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            samples = {stage: np.array(values) * 1000 for stage, values in self.samples.items() if values}
+            counters = dict(self.counters)
+            event_names = list(self.events)
+            gauges = dict(self.gauges)
+
+        stages = {}
+        for stage, values in samples.items():
+            histogram, _ = np.histogram(values, bins=(0,) + BUCKETS_MS)
+            stages[stage] = {
+                'mean_ms': round(float(values.mean()), 3),
+                'p50_ms': round(float(np.percentile(values, 50)), 3),
+                'p95_ms': round(float(np.percentile(values, 95)), 3),
+                'max_ms': round(float(values.max()), 3),
+                'histogram': histogram.tolist(),
+            }
+        return {
+            'time': monotonic(),
+            'rates': {name: round(self.rate(name), 2) for name in event_names},
+            'stages': stages,
+            'counters': counters,
+            'gauges': {name: function() for name, function in gauges.items()},
+        }
+
+
+def format_text(snapshot: dict) -> str:
+    lines = [f"{name}: {rate:.1f} FPS" for name, rate in snapshot['rates'].items()]
+    lines += [f"{stage}: {values['p50_ms']:.1f} / {values['p95_ms']:.1f} ms"
+              for stage, values in snapshot['stages'].items()]
+    lines += [f"{name}: {value}" for name, value in {**snapshot['counters'], **snapshot['gauges']}.items()]
+    return '\n'.join(lines)
+
+
+class MetricsDumper(Thread):
+    """Appends a snapshot to a file every interval seconds, as JSON lines for .json/.jsonl files, text otherwise."""
+
+    def __init__(self, metrics, path: str, interval=10.0) -> None:
+        super().__init__(daemon=True)
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.stop_event = Event()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    def run(self) -> None:
+        as_json = self.path.endswith(('.json', '.jsonl'))
+        while not self.stop_event.wait(self.interval):
+            snapshot = self.metrics.snapshot()
+            with open(self.path, 'a') as file:
+                if as_json:
+                    file.write(json.dumps(snapshot) + '\n')
+                else:
+                    file.write(format_text(snapshot) + '\n\n')
+
+
+metrics = Metrics()
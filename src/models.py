@@ -0,0 +1,42 @@
+import os
+from threading import Lock, Thread
+
+import cv2
+
+from consts import resources_dir
+
+# Haar cascade files in resources_dir by model name
+CASCADES = {
+    'face': 'haarcascade_frontalface_default.xml',
+    'eye': 'haarcascade_eye.xml',
+}
+
+_cascades = {}
+_lock = Lock()
+
+
+def cascade_path(name: str) -> str:
+    return os.path.join(resources_dir, CASCADES[name])
+
+
+def get_cascade(name: str):
+    """Returns the process-wide classifier, loading the XML only on the first call.
+
+    Waits when the same model is being loaded by preload() in the background.
+    """
+    with _lock:
+        cascade = _cascades.get(name)
+        if cascade is None:
+            path = cascade_path(name)
+            cascade = cv2.CascadeClassifier(path)
+            if cascade.empty():
+                raise FileNotFoundError(f"Cannot load cascade {name} from {path}")
+            _cascades[name] = cascade
+        return cascade
+
+
+def preload(names=tuple(CASCADES)) -> Thread:
+    """Loads models in a background thread, so the first detector does not wait for XML parsing."""
+    thread = Thread(target=lambda: [get_cascade(name) for name in names], daemon=True)
+    thread.start()
+    return thread
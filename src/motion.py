@@ -0,0 +1,72 @@
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """Decides whether a frame differs enough from the last detected one to run detection again.
+
+    Frames are reduced to a small grayscale thumbnail and compared with the thumbnail of the frame
+    detection last ran on, not with the previous frame, so slow drift adds up until it is noticed.
+    Detection runs when the mean absolute difference of the whole thumbnail exceeds `threshold`,
+    the difference inside any of the last face/eye boxes exceeds `roi_threshold` (a blink barely
+    changes the whole frame), or when the last result is older than `max_reuse_seconds`, so the limit
+    does not depend on the frame rate. Timestamps are capture times in seconds, one going backwards
+    (another clip, a rewound recording) counts as a change.
+    """
+
+    def __init__(self, thumbnail_width=64, threshold=3.0, roi_threshold=6.0, max_reuse_seconds=0.5) -> None:
+        self.thumbnail_width = thumbnail_width
+        self.threshold = threshold
+        self.roi_threshold = roi_threshold
+        self.max_reuse_seconds = max_reuse_seconds
+
+        self.reference = None
+        self.thumbnail = None
+        self.scale = 1
+        # (x_start, y_start, x_end, y_end) in thumbnail coordinates
+        self.rois = []
+        # Capture time of the reference
+        self.reference_timestamp = None
+
+    def make_thumbnail(self, frame):
+        height, width = frame.shape[:2]
+        self.scale = self.thumbnail_width / width
+        size = (self.thumbnail_width, max(1, int(round(height * self.scale))))
+        thumbnail = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        if thumbnail.ndim == 3:
+            thumbnail = cv2.cvtColor(thumbnail, cv2.COLOR_BGR2GRAY)
+        return thumbnail
+
+    def changed(self, frame, timestamp: float) -> bool:
+        self.thumbnail = self.make_thumbnail(frame)
+        if self.reference is None or self.reference.shape != self.thumbnail.shape:
+            return True
+        age = timestamp - self.reference_timestamp
+        if age < 0 or age >= self.max_reuse_seconds:
+            return True
+
+        difference = cv2.absdiff(self.thumbnail, self.reference)
+        if difference.mean() > self.threshold:
+            return True
+        for (x_start, y_start, x_end, y_end) in self.rois:
+            if difference[y_start: y_end, x_start: x_end].mean() > self.roi_threshold:
+                return True
+        return False
+
+    def update(self, boxes, timestamp: float) -> None:
+        """Takes the thumbnail of the last changed() call as the reference, boxes are (x, y, w, h) in the frame."""
+        self.reference = self.thumbnail
+        self.reference_timestamp = timestamp
+        height, width = self.reference.shape[:2]
+        self.rois = []
+        for (x, y, w, h) in boxes:
+            x_start = min(width - 1, int(np.floor(x * self.scale)))
+            y_start = min(height - 1, int(np.floor(y * self.scale)))
+            x_end = max(x_start + 1, int(np.ceil((x + w) * self.scale)))
+            y_end = max(y_start + 1, int(np.ceil((y + h) * self.scale)))
+            self.rois.append((x_start, y_start, x_end, y_end))
+
+    def reset(self) -> None:
+        self.reference = None
+        self.rois = []
+        self.reference_timestamp = None
@@ -0,0 +1,88 @@
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+# Debug annotations collected by the detection instead of drawing into the frame,
+# in frame coordinates before the preview flip. Plain tuples, so they can be sent between processes.
+Rectangle = namedtuple('Rectangle', 'top_left bottom_right color thickness')
+Circle = namedtuple('Circle', 'center radius color thickness')
+
+DIALOGUE_FONT = cv2.FONT_HERSHEY_TRIPLEX
+DIALOGUE_SCALE = 0.5
+DIALOGUE_COLOR = (255, 255, 255)
+DIALOGUE_PADDING = 70
+
+
+def draw_annotations(frame, annotations, mirrored=False) -> None:
+    """Draws annotations, mirrored=True when frame is the horizontally flipped image they were made on."""
+    last_x = frame.shape[1] - 1
+    for annotation in annotations:
+        if isinstance(annotation, Rectangle):
+            (x1, y1), (x2, y2) = annotation.top_left, annotation.bottom_right
+            if mirrored:
+                x1, x2 = last_x - x2, last_x - x1
+            cv2.rectangle(frame, (x1, y1), (x2, y2), annotation.color, annotation.thickness)
+        elif isinstance(annotation, Circle):
+            x, y = annotation.center
+            if mirrored:
+                x = last_x - x
+            cv2.circle(frame, (x, y), annotation.radius, annotation.color, thickness=annotation.thickness)
+
+
+def dialogue_positions(width: int, height: int):
+    """Text origins of the up, down, left and right phrases."""
+    return [(int(width / 2), DIALOGUE_PADDING),
+            (int(width / 2), height - DIALOGUE_PADDING),
+            (DIALOGUE_PADDING, int(height / 2)),
+            (width - DIALOGUE_PADDING, int(height / 2))]
+
+
+class Compositor:
+    """Draws annotations and the current dialogue phrases onto a preview frame.
+
+    Phrases are rasterised once per dialogue and frame size into small sprites,
+    every frame only copies their text pixels. dialogue_key identifies the dialogue,
+    it has to change whenever its phrases change.
+    """
+
+    def __init__(self, max_cached=64) -> None:
+        # (dialogue key, width, height) -> list of (x, y, sprite, mask)
+        self.sprites = {}
+        # Sprites of the oldest dialogues are dropped above this number
+        self.max_cached = max_cached
+
+    def compose(self, frame, annotations, dialogue, dialogue_key):
+        """Returns a new mirrored preview frame, frame itself is not modified."""
+        preview = cv2.flip(frame, 1)
+        draw_annotations(preview, annotations, mirrored=True)
+        self.draw_dialogue(preview, dialogue, dialogue_key)
+        return preview
+
+    def draw_dialogue(self, frame, dialogue, dialogue_key) -> None:
+        height, width = frame.shape[:2]
+        key = (dialogue_key, width, height)
+        sprites = self.sprites.get(key)
+        if sprites is None:
+            if len(self.sprites) >= self.max_cached:
+                del self.sprites[next(iter(self.sprites))]
+            sprites = self.sprites[key] = self.render_sprites(dialogue, width, height)
+        for x, y, sprite, mask in sprites:
+            region = frame[y: y + sprite.shape[0], x: x + sprite.shape[1]]
+            np.copyto(region, sprite, where=mask)
+
+    @staticmethod
+    def render_sprites(dialogue, width: int, height: int):
+        sprites = []
+        for text, (x, y) in zip(dialogue, dialogue_positions(width, height)):
+            (text_width, text_height), baseline = cv2.getTextSize(text, DIALOGUE_FONT, DIALOGUE_SCALE, 1)
+            # Same pixels as cv2.putText at (x, y) would draw, cut to the frame
+            top, bottom = max(0, y - text_height - 2), min(height, y + baseline + 2)
+            left, right = max(0, x - 2), min(width, x + text_width + 2)
+            if top >= bottom or left >= right:
+                continue
+            canvas = np.zeros((bottom - top, right - left, 3), np.uint8)
+            cv2.putText(canvas, text, (x - left, y - top), DIALOGUE_FONT, DIALOGUE_SCALE, DIALOGUE_COLOR, 1)
+            mask = canvas.any(axis=2, keepdims=True)
+            sprites.append((left, top, canvas, mask))
+        return sprites
@@ -0,0 +1,297 @@
+"""Phrase engine: phrases in a 4-ary tree navigated by gaze, frequently used phrases are closer to the root.
+
+Usage: python phrases.py [PHRASES_FILE] [--usage USAGE_FILE]  (prints selections needed per phrase)
+
+Every screen shows up to four slots (up, down, left, right), each is either a phrase or a group of
+phrases labelled with its most used one. The tree is a 4-ary Huffman tree of the phrase weights
+(use count + 1), so a phrase used with probability p is reached in about log4(1 / p) selections and
+with no usage at all every phrase is reached in about log4(number of phrases) selections.
+"""
+import argparse
+import json
+import os
+from collections import deque
+from threading import Event, Lock, Thread
+
+from chat_database import dialogues
+
+# Slots of a screen in the order of chat_database.dialogues rows and overlay.dialogue_positions
+SLOTS = 4
+DIRECTION_SLOTS = {'Up': 0, 'Down': 1, 'Left': 2, 'Right': 3}
+GROUP_SUFFIX = ' ...'
+
+
+class Phrase:
+    def __init__(self, text: str, position: int, count=0) -> None:
+        self.text = text
+        # Position in the phrases file, breaks ties between equally used phrases
+        self.position = position
+        self.count = count
+
+    @property
+    def weight(self) -> int:
+        return self.count + 1
+
+    @property
+    def top(self):
+        return self
+
+    def rank_key(self):
+        return -self.weight, self.position
+
+
+class PhraseNode:
+    """One screen, slots are Phrase, PhraseNode or None for an empty slot."""
+
+    def __init__(self, index: int, slots) -> None:
+        self.index = index
+        self.slots = slots
+        self.parent = None
+        self.weight = sum(slot.weight for slot in slots if slot is not None)
+        # Best ranked phrase of the whole group, its label
+        self.top = min((slot.top for slot in slots if slot is not None), key=Phrase.rank_key, default=None)
+        for slot in slots:
+            if isinstance(slot, PhraseNode):
+                slot.parent = self
+
+    def labels(self):
+        return [('' if slot is None else slot.text if isinstance(slot, Phrase) else slot.top.text + GROUP_SUFFIX)
+                for slot in self.slots]
+
+
+def read_phrases(path: str):
+    """Phrases of a text file, one per line, without empty lines, # comments and duplicates."""
+    phrases = []
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            text = line.strip()
+            if text and not text.startswith('#') and text not in phrases:
+                phrases.append(text)
+    return phrases
+
+
+def slot_key(slot):
+    # Ordered by the best ranked phrase of every slot, empty slots last
+    if slot is None:
+        return 1, 0, 0
+    return (0,) + slot.top.rank_key()
+
+
+def build_tree(ranked):
+    """4-ary Huffman tree of phrases sorted by rank_key, in linear time.
+
+    Leaves come from the ranked list in ascending weight, merged groups are created in ascending
+    weight too, so the lightest four are always at the fronts of the two queues.
+    """
+    if len(ranked) <= SLOTS:
+        return PhraseNode(0, list(ranked) + [None] * (SLOTS - len(ranked)))
+
+    leaves = deque(reversed(ranked))
+    # Every merge replaces four by one, the smallest groups are padded with empty slots so the root is full
+    padding = (1 - len(ranked)) % (SLOTS - 1)
+    groups = deque()
+    index = 0
+    first = True
+    while len(leaves) + len(groups) > 1:
+        slots = [None] * padding if first else []
+        first = False
+        while len(slots) < SLOTS:
+            if not groups or (leaves and leaves[0].weight <= groups[0].weight):
+                slots.append(leaves.popleft())
+            else:
+                slots.append(groups.popleft())
+        slots.sort(key=slot_key)
+        groups.append(PhraseNode(index, slots))
+        index += 1
+    return groups[0]
+
+
+class UsageWriter(Thread):
+    """Writes phrase usage counts to path off the tracking thread.
+
+    Selections made within delay seconds of each other are written once, close() writes what is left.
+    """
+
+    def __init__(self, path: str, delay=2.0) -> None:
+        super().__init__(daemon=True)
+        self.path = path
+        self.delay = delay
+        self.lock = Lock()
+        self.pending = None
+        self.wake = Event()
+        self.stop_event = Event()
+
+    def put(self, usage: dict) -> None:
+        with self.lock:
+            self.pending = usage
+        self.wake.set()
+
+    def flush(self) -> None:
+        with self.lock:
+            usage, self.pending = self.pending, None
+        if usage is None:
+            return
+        temporary_path = self.path + '.tmp'
+        try:
+            with open(temporary_path, 'w', encoding='utf-8') as file:
+                json.dump(usage, file, ensure_ascii=False, indent=0)
+            # Never leaves a half written file behind
+            os.replace(temporary_path, self.path)
+        except OSError as e:
+            print(f"Phrase usage not saved to {self.path}: {e}")
+
+    def close(self) -> None:
+        self.stop_event.set()
+        self.wake.set()
+        if self.is_alive():
+            self.join()
+        self.flush()
+
+    def run(self) -> None:
+        while not self.stop_event.is_set():
+            self.wake.wait()
+            self.wake.clear()
+            self.stop_event.wait(self.delay)
+            self.flush()
+
+
+class PhraseEngine:
+    """Gaze navigation over the phrase tree with usage counts persisted to usage_path.
+
+    select() and back() only follow a slot or the parent link. After a phrase is selected its count
+    goes up and it is moved forward in the ranking (usually by a few places). The tree is rebuilt from
+    the ranking in linear time when the next screen is needed, the screens change only between messages.
+    Usage is written by a UsageWriter thread, close() writes the last selections.
+    """
+
+    def __init__(self, phrases, usage_path: str = None) -> None:
+        self.usage_path = usage_path
+        # text -> use count of the phrases used at least once, what gets saved
+        self.usage = self.load_usage()
+        self.ranked = sorted((Phrase(text, position, self.usage.get(text, 0))
+                              for position, text in enumerate(phrases)), key=Phrase.rank_key)
+        # Phrase -> its index in ranked
+        self.ranks = {phrase: rank for rank, phrase in enumerate(self.ranked)}
+        self.writer = None
+        # Changes with every rebuild, part of the key of the screen sprites
+        self.generation = 0
+        self.root = build_tree(self.ranked)
+        self.node = self.root
+        # Set by use(), the tree is rebuilt by screen()
+        self.stale = False
+        # Selections made for the current message, including the one of the phrase
+        self.steps = 0
+
+    @classmethod
+    def from_file(cls, path: str, usage_path: str = None):
+        """Phrases of the file, the rows of chat_database.dialogues when it does not exist."""
+        if path and os.path.exists(path):
+            return cls(read_phrases(path), usage_path)
+        return cls([text for dialogue in dialogues for text in dialogue], usage_path)
+
+    def load_usage(self) -> dict:
+        if not self.usage_path or not os.path.exists(self.usage_path):
+            return {}
+        try:
+            with open(self.usage_path, encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"Phrase usage not loaded from {self.usage_path}: {e}")
+            return {}
+
+    def save_usage(self) -> None:
+        if not self.usage_path:
+            return
+        if self.writer is None:
+            self.writer = UsageWriter(self.usage_path)
+            self.writer.start()
+        self.writer.put(dict(self.usage))
+
+    def close(self) -> None:
+        """Writes usage which is not saved yet."""
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def screen(self) -> PhraseNode:
+        """Current screen, the first call after a selection rebuilds the tree and starts from its root."""
+        if self.stale:
+            self.root = build_tree(self.ranked)
+            self.generation += 1
+            self.node = self.root
+            self.stale = False
+        return self.node
+
+    def dialogue(self):
+        """Labels of the current screen."""
+        return self.screen().labels()
+
+    def key(self):
+        """Changes whenever the labels of the current screen change."""
+        return self.generation, self.screen().index
+
+    def select(self, slot: int):
+        """Follows slot of the current screen, returns the phrase when one was selected."""
+        target = self.screen().slots[slot]
+        if target is None:
+            return None
+        self.steps += 1
+        if isinstance(target, PhraseNode):
+            self.node = target
+            return None
+
+        self.use(target)
+        return target.text
+
+    def back(self) -> bool:
+        """Goes to the parent screen, False on the root."""
+        node = self.screen()
+        if node.parent is None:
+            return False
+        self.node = node.parent
+        return True
+
+    def use(self, phrase: Phrase) -> None:
+        phrase.count += 1
+        self.usage[phrase.text] = phrase.count
+        i = self.ranks[phrase]
+        while i > 0 and self.ranked[i - 1].rank_key() > phrase.rank_key():
+            self.ranked[i] = self.ranked[i - 1]
+            self.ranks[self.ranked[i]] = i
+            i -= 1
+        self.ranked[i] = phrase
+        self.ranks[phrase] = i
+        self.save_usage()
+
+        self.stale = True
+        self.steps = 0
+
+
+def depths(node: PhraseNode, depth=1):
+    """(phrase, selections needed) of every phrase under node."""
+    for slot in node.slots:
+        if isinstance(slot, Phrase):
+            yield slot, depth
+        elif slot is not None:
+            yield from depths(slot, depth + 1)
+
+
+def main():
+    from consts import phrases_file, phrase_usage_file
+
+    parser = argparse.ArgumentParser(description='Selections needed per phrase')
+    parser.add_argument('phrases', nargs='?', default=phrases_file)
+    parser.add_argument('--usage', default=phrase_usage_file)
+    args = parser.parse_args()
+
+    engine = PhraseEngine.from_file(args.phrases, args.usage)
+    total_weight = sum(phrase.weight for phrase in engine.ranked)
+    expected = 0
+    for phrase, depth in sorted(depths(engine.root), key=lambda item: item[1]):
+        print(f"{depth}  {phrase.count:5}  {phrase.text}")
+        expected += depth * phrase.weight / total_weight
+    print(f"{len(engine.ranked)} phrases, {expected:.2f} selections per message on average")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+import heapq
+import multiprocessing as mp
+import queue
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+from threading import Thread
+
+import cv2
+import numpy as np
+
+from util import FrameMailbox
+
+# One detected frame, measurements are GazeDetector.measurements() for apply_temporal_state()
+DetectionResult = namedtuple('DetectionResult', 'frame slot timestamp blink eye_status annotations measurements')
+
+
+class FrameRing:
+    """Fixed number of frame slots in shared memory.
+
+    Frames are written and read in place through numpy views, only slot indices travel through queues.
+    """
+
+    def __init__(self, slots: int, shape: tuple, name: str = None) -> None:
+        self.slots = slots
+        self.shape = tuple(shape)
+        size = slots * int(np.prod(self.shape))
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self.shm.buf)
+
+    def spec(self) -> tuple:
+        """Everything another process needs to attach to this ring."""
+        return self.slots, self.shape, self.shm.name
+
+    @classmethod
+    def attach(cls, spec: tuple):
+        slots, shape, name = spec
+        return cls(slots, shape, name)
+
+    def close(self) -> None:
+        self.frames = None
+        self.shm.close()
+
+    def unlink(self) -> None:
+        self.shm.unlink()
+
+
+def capture_process(camera, slots, spec_queue, free_slots, work_queue, stop, workers):
+    cap = cv2.VideoCapture(camera)
+    ret, first_frame = cap.read()
+    first_timestamp = time.monotonic()
+    if not ret:
+        print("Error opening video stream or file")
+        spec_queue.put(None)
+        cap.release()
+        return
+
+    ring = FrameRing(slots, first_frame.shape)
+    ring.frames[0] = first_frame
+    spec_queue.put(ring.spec())
+
+    # Read straight into the shared slot
+    feed_ring(lambda slot_frame: time.monotonic() if cap.read(slot_frame)[0] else None,
+              ring, first_timestamp, free_slots, work_queue, stop, workers)
+    cap.release()
+    ring.close()
+
+
+def feed_ring(read, ring, first_timestamp, free_slots, work_queue, stop, workers):
+    """Fills free slots with read(slot_frame) and queues them for the workers.
+
+    read returns the capture timestamp, None when there are no more frames. Slot 0 must be already filled.
+    """
+    frame_number = 0
+    slot = 0
+    timestamp = first_timestamp
+    while not stop.is_set():
+        if slot is None:
+            try:
+                slot = free_slots.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            timestamp = read(ring.frames[slot])
+            if timestamp is None:
+                # End of file, camera disconnected or stopped
+                free_slots.put(slot)
+                break
+
+        work_queue.put((frame_number, slot, timestamp))
+        frame_number += 1
+        slot = None
+
+    for _ in range(workers):
+        work_queue.put(None)
+
+
+def detector_process(spec, work_queue, result_queue):
+    # Imported here so that the GUI process does not load cascades for every worker
+    from gaze import GazeDetector
+
+    ring = FrameRing.attach(spec)
+    detector = GazeDetector()
+    # Frames are spread over the workers, state which needs every frame is kept by the consumer
+    detector.make_stateless()
+    while True:
+        item = work_queue.get()
+        if item is None:
+            break
+        frame_number, slot, timestamp = item
+        annotations = []
+        blink, eye_status = detector.detect(ring.frames[slot], annotations, timestamp)
+        result_queue.put((frame_number, slot, timestamp, blink, eye_status, annotations, detector.measurements()))
+    result_queue.put(None)
+    ring.close()
+
+
+class DetectionPipeline:
+    """Capture process -> shared memory ring -> detector processes -> results re-ordered by frame number.
+
+    Instead of opening the camera in a capture process, frames can also come from a FrameMailbox
+    (for example subscribed to the CameraService), then a thread copies them into the ring.
+    Detector workers send their debug annotations with the results, the consumer gets the shared
+    frame view and has to call release(slot) once it does not need it anymore.
+
+    Workers are stateless (GazeDetector.make_stateless), results come in frame order, so the consumer
+    applies the temporal state (smoothing, blink dips) with GazeDetector.apply_temporal_state.
+    When a process dies results() raises RuntimeError instead of waiting for it forever.
+    """
+
+    def __init__(self, camera=None, workers=2, slots=8, frames: FrameMailbox = None, start_timeout=10.0) -> None:
+        self.camera = camera
+        self.frames = frames
+        self.workers = workers
+        self.slots = slots
+        # Seconds the capture process has to open the camera and read the first frame
+        self.start_timeout = start_timeout
+        self.context = mp.get_context('spawn')
+        self.stop_event = self.context.Event()
+        self.free_slots = self.context.Queue()
+        self.work_queue = self.context.Queue()
+        self.result_queue = self.context.Queue()
+        self.processes = []
+        self.ring = None
+        self.feeder = None
+        self.next_frame = 0
+        self.pending = []
+        self.finished_workers = 0
+
+    def start(self) -> bool:
+        for slot in range(1, self.slots):
+            self.free_slots.put(slot)
+
+        if self.frames is None:
+            spec_queue = self.context.Queue()
+            capture = self.context.Process(target=capture_process, daemon=True,
+                                           args=(self.camera, self.slots, spec_queue, self.free_slots,
+                                                 self.work_queue, self.stop_event, self.workers))
+            capture.start()
+            self.processes.append(capture)
+
+            spec = self.wait_for_spec(spec_queue, capture)
+            if spec is None:
+                return False
+            self.ring = FrameRing.attach(spec)
+        else:
+            item = self.next_mailbox_frame()
+            if item is None:
+                return False
+            first_frame, first_timestamp = item
+            self.ring = FrameRing(self.slots, first_frame.shape)
+            self.ring.frames[0] = first_frame
+            spec = self.ring.spec()
+            self.feeder = Thread(target=feed_ring, daemon=True,
+                                 args=(self.copy_mailbox_frame, self.ring, first_timestamp, self.free_slots,
+                                       self.work_queue, self.stop_event, self.workers))
+            self.feeder.start()
+
+        for _ in range(self.workers):
+            worker = self.context.Process(target=detector_process, daemon=True,
+                                          args=(spec, self.work_queue, self.result_queue))
+            worker.start()
+            self.processes.append(worker)
+        return True
+
+    def wait_for_spec(self, spec_queue, capture):
+        """Ring spec sent by the capture process, None when it failed, died or took longer than start_timeout."""
+        deadline = time.monotonic() + self.start_timeout
+        while time.monotonic() < deadline:
+            try:
+                return spec_queue.get(timeout=0.1)
+            except queue.Empty:
+                if not capture.is_alive():
+                    print(f"Capture process exited with code {capture.exitcode}")
+                    return None
+        print(f"Capture process did not start in {self.start_timeout:.0f}s")
+        return None
+
+    def check_processes(self) -> None:
+        """Raises RuntimeError when the capture or a detector process died."""
+        for process in self.processes:
+            if not process.is_alive() and process.exitcode != 0:
+                self.stop()
+                raise RuntimeError(f"{process.name} exited with code {process.exitcode}")
+
+    def results(self, timeout=0.1):
+        """Yields DetectionResult in frame order until all workers are finished."""
+        while self.finished_workers < self.workers:
+            try:
+                item = self.result_queue.get(timeout=timeout)
+            except queue.Empty:
+                self.check_processes()
+                continue
+            if item is None:
+                self.finished_workers += 1
+                continue
+
+            heapq.heappush(self.pending, item)
+            while self.pending and self.pending[0][0] == self.next_frame:
+                frame_number, slot, *result = heapq.heappop(self.pending)
+                self.next_frame += 1
+                yield DetectionResult(self.ring.frames[slot], slot, *result)
+
+    def next_mailbox_frame(self):
+        """(frame, capture timestamp) or None when stopped."""
+        while not self.stop_event.is_set():
+            item = self.frames.wait_take_stamped(0.1)
+            if item is not None:
+                return item
+        return None
+
+    def copy_mailbox_frame(self, slot_frame):
+        item = self.next_mailbox_frame()
+        if item is None:
+            return None
+        frame, timestamp = item
+        if frame.shape == slot_frame.shape:
+            np.copyto(slot_frame, frame)
+        else:
+            # Camera was switched to another resolution
+            cv2.resize(frame, (slot_frame.shape[1], slot_frame.shape[0]), dst=slot_frame)
+        return timestamp
+
+    def release(self, slot: int) -> None:
+        self.free_slots.put(slot)
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    def join(self, timeout=2) -> None:
+        if self.feeder is not None:
+            self.feeder.join(timeout)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring.unlink()
+            self.ring = None
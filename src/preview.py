@@ -0,0 +1,83 @@
+import cv2
+import numpy as np
+
+from util import FrameMailbox
+
+
+class PreviewMailbox(FrameMailbox):
+    """Latest-frame mailbox that also prepares the frame for display.
+
+    Colour conversion and resizing to the preview size run in the producer thread,
+    into a few reused buffers, so the GUI thread only wraps a ready RGB image.
+    Frames put while the preview is disabled are skipped without any processing.
+    """
+
+    def __init__(self, width=1280, height=1024, buffer_count=4):
+        super().__init__()
+        self.width = width
+        self.height = height
+        self.enabled = True
+        self.skipped = 0
+
+        # Every buffer is a pair of (resized BGR, RGB) arrays
+        self.buffers = [None] * buffer_count
+        # Buffers which are being rendered, waiting in the mailbox or shown by the GUI
+        self.busy = set()
+        self.shown = None
+
+    def set_target_size(self, width: int, height: int):
+        with self.lock:
+            self.width = max(1, width)
+            self.height = max(1, height)
+
+    def put(self, frame, timestamp=None):
+        if not self.enabled:
+            self.skipped += 1
+            return
+
+        with self.lock:
+            index = next((i for i in range(len(self.buffers)) if i not in self.busy), None)
+            if index is None:
+                self.skipped += 1
+                return
+            self.busy.add(index)
+            width, height = self.width, self.height
+
+        rgb = self.render(frame, index, width, height)
+
+        with self.lock:
+            if self.frame is not None:
+                self.dropped += 1
+                self.busy.discard(self.frame[0])
+            self.frame = (index, rgb)
+
+    def take(self):
+        """Returns (buffer index, RGB image) or None. The image stays valid until the next take()."""
+        with self.lock:
+            if self.shown is not None:
+                self.busy.discard(self.shown)
+            item = self.frame
+            self.frame = None
+            self.shown = item[0] if item is not None else None
+            if item is not None:
+                self.delivered += 1
+            return item
+
+    def render(self, frame, index: int, width: int, height: int):
+        frame_height, frame_width = frame.shape[:2]
+        scale = min(width / frame_width, height / frame_height)
+        size = (max(1, int(frame_width * scale)), max(1, int(frame_height * scale)))
+
+        buffer = self.buffers[index]
+        if buffer is None or buffer[1].shape[:2] != (size[1], size[0]):
+            buffer = (np.empty((size[1], size[0], 3), np.uint8), np.empty((size[1], size[0], 3), np.uint8))
+            self.buffers[index] = buffer
+        resized, rgb = buffer
+
+        if size == (frame_width, frame_height):
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb)
+        else:
+            interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+            cv2.resize(frame, size, dst=resized, interpolation=interpolation)
+            cv2.cvtColor(resized, cv2.COLOR_BGR2RGB, dst=rgb)
+        return rgb
@@ -0,0 +1,81 @@
+import cv2
+import numpy as np
+
+
+class PupilLocator:
+    """Finds pupil candidates in a grayscale eye crop.
+
+    locate returns an (N, 3) array of x, y, r in eye crop coordinates, or None when nothing was found.
+    resolution_scale is the camera frame width relative to the width the parameters are tuned for.
+    """
+    name = None
+
+    def locate(self, eye_gray, resolution_scale=1):
+        raise NotImplementedError
+
+
+class HoughPupilLocator(PupilLocator):
+    name = 'hough'
+
+    def __init__(self, blur_mask_size=3, canny_param_1=30, canny_param_2=15,
+                 min_radius=3, max_radius=12, min_dist=2) -> None:
+        self.blur_mask_size = blur_mask_size
+        self.canny_param_1 = canny_param_1
+        self.canny_param_2 = canny_param_2
+        self.min_radius = min_radius
+        self.max_radius = max_radius
+        self.min_dist = min_dist
+
+    def locate(self, eye_gray, resolution_scale=1):
+        eye_blur = cv2.medianBlur(eye_gray, self.blur_mask_size)
+        circles = cv2.HoughCircles(eye_blur, cv2.HOUGH_GRADIENT, 1,
+                                   max(1, self.min_dist * resolution_scale),
+                                   param1=self.canny_param_1,
+                                   param2=self.canny_param_2,
+                                   minRadius=int(round(self.min_radius * resolution_scale)),
+                                   maxRadius=int(round(self.max_radius * resolution_scale)))
+        if circles is None:
+            return None
+        return np.reshape(circles, (-1, 3))
+
+
+class BlobPupilLocator(PupilLocator):
+    """Centroid of the largest dark blob, much cheaper than Hough and does not jump between circles.
+
+    The darkest dark_percentile of the blurred crop is thresholded, the top part of the crop
+    is skipped because the eye cascade box usually contains the eyebrow.
+    """
+    name = 'blob'
+
+    def __init__(self, blur_mask_size=5, dark_percentile=8, top_margin=0.25) -> None:
+        self.blur_mask_size = blur_mask_size
+        self.dark_percentile = dark_percentile
+        self.top_margin = top_margin
+
+    def locate(self, eye_gray, resolution_scale=1):
+        top = int(eye_gray.shape[0] * self.top_margin)
+        eye_crop = eye_gray[top:, :]
+        if eye_crop.size == 0:
+            return None
+
+        eye_blur = cv2.GaussianBlur(eye_crop, (self.blur_mask_size, self.blur_mask_size), 0)
+        threshold = np.percentile(eye_blur, self.dark_percentile)
+        _, mask = cv2.threshold(eye_blur, threshold, 255, cv2.THRESH_BINARY_INV)
+
+        count, _, stats, centroids = cv2.connectedComponentsWithStats(mask)
+        if count < 2:
+            return None
+        largest = 1 + np.argmax(stats[1:, cv2.CC_STAT_AREA])
+        x, y = centroids[largest]
+        radius = np.sqrt(stats[largest, cv2.CC_STAT_AREA] / np.pi)
+        return np.array([[x, y + top, radius]], dtype=np.float32)
+
+
+PUPIL_LOCATORS = {
+    HoughPupilLocator.name: HoughPupilLocator,
+    BlobPupilLocator.name: BlobPupilLocator,
+}
+
+
+def create_pupil_locator(name: str) -> PupilLocator:
+    return PUPIL_LOCATORS[name]()
@@ -0,0 +1,89 @@
+"""Compares speed and stability of the pupil locators.
+
+Usage: python pupil_benchmark.py [--repeat N] clip.mp4 Eye_0.png ...
+
+Video clips go through the face/eye detection first and every located eye crop is used,
+images are taken as eye crops directly. Stability is the mean pupil movement (in pixels)
+between consecutive crops of the first eye of a clip, lower is steadier.
+"""
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+from gaze import GazeDetector
+from iris import classify_iris
+from pupil import PUPIL_LOCATORS, create_pupil_locator
+from sources import IMAGE_EXTENSIONS, VideoFileSource
+
+
+def eye_crops(paths, detector: GazeDetector):
+    """Returns list of sequences of grayscale eye crops, one sequence per clip or image."""
+    sequences = []
+    for path in paths:
+        if path.lower().endswith(IMAGE_EXTENSIONS):
+            sequences.append([cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2GRAY)])
+            continue
+
+        crops = []
+        with VideoFileSource(path) as source:
+            for _, frame in source:
+                detection = detector.detector.detect(frame)
+                if detection.eye_rois and detection.eye_rois[0]:
+                    crops.append(detection.eye_rois[0][0])
+        sequences.append(crops)
+    return sequences
+
+
+def benchmark(locator, sequences, repeat=1):
+    timings = []
+    found = 0
+    total = 0
+    movements = []
+    for crops in sequences:
+        last_pupil = None
+        for crop in crops:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                circles = locator.locate(crop)
+                timings.append(time.perf_counter() - start)
+            total += 1
+            if circles is None:
+                last_pupil = None
+                continue
+            found += 1
+            centre = (crop.shape[1] // 2, crop.shape[0] // 2)
+            circle, _, _ = classify_iris(circles, centre, 0)
+            if last_pupil is not None:
+                movements.append(np.hypot(circle[0] - last_pupil[0], circle[1] - last_pupil[1]))
+            last_pupil = circle
+
+    timings = np.array(timings) * 1000
+    return {
+        'crops': total,
+        'found': found / total if total else 0,
+        'mean_ms': timings.mean() if len(timings) else 0,
+        'p95_ms': np.percentile(timings, 95) if len(timings) else 0,
+        'jitter_px': np.mean(movements) if movements else float('nan'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pupil locator benchmark')
+    parser.add_argument('inputs', nargs='*', help='video clips or eye crop images')
+    parser.add_argument('--repeat', type=int, default=20, help='timed calls per crop')
+    args = parser.parse_args()
+
+    inputs = args.inputs or sorted(f for f in os.listdir('.') if f.startswith('Eye_') and f.endswith('.png'))
+    sequences = eye_crops(inputs, GazeDetector())
+    print(f"{'locator':10} {'crops':>6} {'found':>6} {'mean ms':>8} {'p95 ms':>8} {'jitter px':>9}")
+    for name in PUPIL_LOCATORS:
+        result = benchmark(create_pupil_locator(name), sequences, args.repeat)
+        print(f"{name:10} {result['crops']:6d} {result['found']:6.0%} {result['mean_ms']:8.3f} "
+              f"{result['p95_ms']:8.3f} {result['jitter_px']:9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+class QualityLevel:
+    """Detection settings which trade accuracy for processing time."""
+
+    def __init__(self, name: str, face_detection_width, eye_detection_width, redetect_interval: int,
+                 fast_pupil: bool, blink_interval: int) -> None:
+        self.name = name
+        self.face_detection_width = face_detection_width
+        self.eye_detection_width = eye_detection_width
+        self.redetect_interval = redetect_interval
+        # Use the cheap blob pupil locator instead of the selected one
+        self.fast_pupil = fast_pupil
+        # Blink is checked every blink_interval frames, the last result is reused in between
+        self.blink_interval = blink_interval
+
+
+# From the best to the cheapest, the first one matches the GazeDetector defaults
+QUALITY_LEVELS = (
+    QualityLevel('high', 320, 240, 10, False, 1),
+    QualityLevel('medium', 240, 160, 20, False, 2),
+    QualityLevel('low', 160, 120, 30, True, 2),
+    QualityLevel('minimal', 128, 96, 60, True, 3),
+)
+
+
+class QualityController:
+    """Picks a quality level which keeps the per-frame processing time within the budget.
+
+    The budget is 1 / target_fps, or latency_budget seconds when that is lower. Processing time is
+    smoothed with an exponential moving average. The level drops when the average is over the budget
+    and goes up again only when it is below upgrade_ratio of the budget, at most once per
+    cooldown frames (three times longer for going up), so the level does not oscillate.
+    """
+
+    def __init__(self, target_fps=15, latency_budget=None, levels=QUALITY_LEVELS,
+                 smoothing=0.1, upgrade_ratio=0.6, cooldown=15) -> None:
+        self.levels = levels
+        self.budget = 1 / target_fps
+        if latency_budget is not None:
+            self.budget = min(self.budget, latency_budget)
+        self.smoothing = smoothing
+        self.upgrade_ratio = upgrade_ratio
+        self.cooldown = cooldown
+
+        self.index = 0
+        self.average = None
+        self.frames_since_change = 0
+
+    @property
+    def level(self) -> QualityLevel:
+        return self.levels[self.index]
+
+    def update(self, seconds: float):
+        """Records processing time of one frame, returns the new level when it changed, None otherwise."""
+        if self.average is None:
+            self.average = seconds
+        else:
+            self.average += self.smoothing * (seconds - self.average)
+        self.frames_since_change += 1
+
+        if self.frames_since_change < self.cooldown:
+            return None
+        if self.average > self.budget and self.index < len(self.levels) - 1:
+            return self._change(self.index + 1)
+        if (self.average < self.budget * self.upgrade_ratio and self.index > 0
+                and self.frames_since_change >= 3 * self.cooldown):
+            return self._change(self.index - 1)
+        return None
+
+    def _change(self, index: int) -> QualityLevel:
+        self.index = index
+        self.frames_since_change = 0
+        # Processing time of the new level is not known yet
+        self.average = None
+        return self.level
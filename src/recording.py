@@ -0,0 +1,230 @@
+"""Lossless session recordings with capture timestamps, replayed through a memory map.
+
+Usage: python recording.py record OUTPUT.aocrec [--camera 0] [--seconds 60] [--codec raw|png]
+       python recording.py info FILE.aocrec
+
+File layout: 64 byte header, frame records aligned to 64 bytes, the index (one INDEX_DTYPE
+row per frame) and the footer with the index offset and frame count. Raw frames are read back
+as zero-copy NumPy views of the mapped file, PNG frames are decoded on access.
+
+Every frame record starts with a 64 byte RECORD header with the same fields as its index row,
+so when the session was not closed (crash, killed process) the reader rebuilds the index by
+scanning the records and keeps every frame which was completely written.
+"""
+import argparse
+import mmap
+import os
+import queue
+import struct
+import time
+from threading import Thread
+
+import cv2
+import numpy as np
+
+MAGIC = b'AOCREC01'
+# Version 1 files have no record headers and can only be read with their index
+VERSION = 2
+HEADER = struct.Struct('<8sI')
+HEADER_SIZE = 64
+FOOTER = struct.Struct('<QQ8s')
+ALIGNMENT = 64
+# Record magic, data size, timestamp, height, width, channels, codec, padded to RECORD_SIZE
+RECORD = struct.Struct('<4sQdIIII')
+RECORD_MAGIC = b'FRM '
+RECORD_SIZE = 64
+CODECS = {'raw': 0, 'png': 1}
+INDEX_DTYPE = np.dtype([('offset', '<u8'), ('size', '<u8'), ('timestamp', '<f8'),
+                        ('height', '<u4'), ('width', '<u4'), ('channels', '<u4'), ('codec', '<u4')])
+
+
+class SessionWriter:
+    def __init__(self, path: str, codec='raw') -> None:
+        self.codec = codec
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION).ljust(HEADER_SIZE, b'\0'))
+        self.index = []
+
+    def write(self, frame, timestamp: float) -> None:
+        if self.codec == 'png':
+            # Fastest PNG compression, still lossless
+            _, encoded = cv2.imencode('.png', frame, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+            data = encoded.tobytes()
+        else:
+            data = np.ascontiguousarray(frame).tobytes()
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+        row = (len(data), timestamp, frame.shape[0], frame.shape[1], channels, CODECS[self.codec])
+        self.file.write(RECORD.pack(RECORD_MAGIC, *row).ljust(RECORD_SIZE, b'\0'))
+        offset = self.file.tell()
+        self.file.write(data)
+        self.file.write(b'\0' * (-len(data) % ALIGNMENT))
+        self.index.append((offset,) + row)
+        # A killed process loses nothing which was handed to the OS, see SessionReader.scan
+        self.file.flush()
+
+    def close(self) -> None:
+        index_offset = self.file.tell()
+        self.file.write(np.array(self.index, dtype=INDEX_DTYPE).tobytes())
+        self.file.write(FOOTER.pack(index_offset, len(self.index), MAGIC))
+        self.file.close()
+
+
+class SessionRecorder(Thread):
+    """Records frames given to put() in a background thread, put can be subscribed to the CameraService.
+
+    Timestamps are the capture times given by the CameraService (time of put() without one),
+    relative to the first frame. When the disk cannot keep up more than max_pending frames are waiting,
+    new frames are dropped and counted.
+    """
+
+    def __init__(self, path: str, codec='raw', max_pending=64) -> None:
+        super().__init__(daemon=True)
+        self.path = path
+        self.writer = SessionWriter(path, codec)
+        self.pending = queue.Queue(max_pending)
+        self.started = None
+        self.recorded = 0
+        self.dropped = 0
+
+    def put(self, frame, timestamp=None) -> None:
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if self.started is None:
+            self.started = timestamp
+        try:
+            self.pending.put_nowait((frame, timestamp - self.started))
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self) -> None:
+        self.pending.put(None)
+
+    def run(self) -> None:
+        while True:
+            item = self.pending.get()
+            if item is None:
+                break
+            self.writer.write(*item)
+            self.recorded += 1
+        self.writer.close()
+
+
+class SessionReader:
+    """Memory-mapped recording, frame(i) of a raw recording is a read-only view into the file.
+
+    complete is False when the index was rebuilt from the frame records of a session which was not closed.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self.map) < HEADER_SIZE:
+            raise ValueError(f"{path} is not a session recording")
+        magic, version = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a session recording")
+        end_magic = None
+        if len(self.map) >= HEADER_SIZE + FOOTER.size:
+            index_offset, count, end_magic = FOOTER.unpack_from(self.map, len(self.map) - FOOTER.size)
+        self.complete = end_magic == MAGIC
+        if self.complete:
+            self.index = np.frombuffer(self.map, INDEX_DTYPE, count, index_offset)
+        elif version >= 2:
+            self.index = self.scan()
+            print(f"{path} was not closed, recovered {len(self.index)} frames")
+        else:
+            raise ValueError(f"{path} is not a complete session recording")
+        self.timestamps = self.index['timestamp']
+
+    def scan(self):
+        """Index of all complete frame records, in file order."""
+        rows = []
+        offset = HEADER_SIZE
+        while offset + RECORD_SIZE <= len(self.map):
+            magic, size, timestamp, height, width, channels, codec = RECORD.unpack_from(self.map, offset)
+            data_offset = offset + RECORD_SIZE
+            if magic != RECORD_MAGIC or data_offset + size > len(self.map):
+                break
+            rows.append((data_offset, size, timestamp, height, width, channels, codec))
+            offset = data_offset + size + (-size % ALIGNMENT)
+        return np.array(rows, dtype=INDEX_DTYPE)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def frame(self, i: int):
+        offset, size, _, height, width, channels, codec = self.index[i]
+        data = np.frombuffer(self.map, np.uint8, int(size), int(offset))
+        if codec == CODECS['png']:
+            return cv2.imdecode(data, cv2.IMREAD_UNCHANGED)
+        shape = (height, width) if channels == 1 else (height, width, channels)
+        return data.reshape(shape)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield float(self.timestamps[i]), self.frame(i)
+
+    def close(self) -> None:
+        self.index = self.timestamps = None
+        try:
+            self.map.close()
+        except BufferError:
+            # Frame views are still in use, the map is closed when they are garbage collected
+            pass
+
+
+def record(output: str, camera, seconds: float, codec: str) -> None:
+    from camera import CameraService
+
+    recorder = SessionRecorder(output, codec)
+    recorder.start()
+    camera_service = CameraService(camera)
+    camera_service.subscribe(recorder.put)
+    camera_service.start()
+    end = time.monotonic() + seconds
+    try:
+        while time.monotonic() < end:
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        pass
+    camera_service.unsubscribe(recorder.put)
+    camera_service.stop()
+    camera_service.join()
+    recorder.stop()
+    recorder.join()
+    print(f"Recorded {recorder.recorded} frames to {output}, dropped {recorder.dropped}")
+
+
+def info(path: str) -> None:
+    reader = SessionReader(path)
+    count = len(reader)
+    duration = float(reader.timestamps[-1]) if count else 0
+    codec = {value: name for name, value in CODECS.items()}[int(reader.index['codec'][0])] if count else '-'
+    print(f"{path}: {count} frames, {duration:.2f}s, {count / duration if duration else 0:.1f} FPS, "
+          f"codec {codec}, {os.path.getsize(path) / 1e6:.1f} MB")
+    reader.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Session recordings')
+    commands = parser.add_subparsers(dest='command', required=True)
+    record_parser = commands.add_parser('record', help='record the camera until Ctrl+C or --seconds')
+    record_parser.add_argument('output')
+    record_parser.add_argument('--camera', default='0', help='camera index or video file')
+    record_parser.add_argument('--seconds', type=float, default=float('inf'))
+    record_parser.add_argument('--codec', default='png', choices=list(CODECS))
+    info_parser = commands.add_parser('info', help='show frame count, duration and size')
+    info_parser.add_argument('file')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        camera = int(args.camera) if args.camera.isdigit() else args.camera
+        record(args.output, camera, args.seconds, args.codec)
+    else:
+        info(args.file)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,54 +1,105 @@
-from queue import Queue
+import time
 from threading import Thread
 from eye import Direction
-import pyautogui
+from gaze_events import GazeEventBus, SHUTDOWN
+
+
+class ScrollActuator:
+    """Merges scroll requests and sends them to pyautogui at most once per min_interval seconds.
+
+    Every pyautogui call takes a few milliseconds and ends up in the OS input queue,
+    so requests which come in the meantime are summed up into a single scroll/hscroll call.
+    """
+
+    def __init__(self, min_interval=0.1) -> None:
+        self.min_interval = min_interval
+        self.vertical = 0
+        self.horizontal = 0
+        self.last_flush = -min_interval
+        # pyautogui is slow to import, it is loaded by the Scroller thread, see load()
+        self.pyautogui = None
+
+    def load(self) -> None:
+        if self.pyautogui is None:
+            import pyautogui
+            self.pyautogui = pyautogui
+
+    def request(self, direction: Direction, ticks: int) -> None:
+        if direction == Direction.UP:
+            self.vertical += ticks
+        elif direction == Direction.DOWN:
+            self.vertical -= ticks
+        elif direction == Direction.RIGHT:
+            self.horizontal += ticks
+        elif direction == Direction.LEFT:
+            self.horizontal -= ticks
+
+    def pending(self) -> bool:
+        return self.vertical != 0 or self.horizontal != 0
+
+    def time_to_flush(self, now: float):
+        """Seconds until the pending requests may be sent, None when there are none."""
+        if not self.pending():
+            return None
+        return max(0, self.last_flush + self.min_interval - now)
+
+    def flush(self, now: float) -> None:
+        if not self.pending() or now - self.last_flush < self.min_interval:
+            return
+        self.load()
+        if self.vertical:
+            self.pyautogui.scroll(self.vertical)
+            print(f'Scrolling {"UP" if self.vertical > 0 else "DOWN"} by {abs(self.vertical)}')
+        if self.horizontal:
+            self.pyautogui.hscroll(self.horizontal)
+            print(f'Scrolling {"RIGHT" if self.horizontal > 0 else "LEFT"} by {abs(self.horizontal)}')
+        self.vertical = 0
+        self.horizontal = 0
+        self.last_flush = now
+
 
 class Scroller(Thread):
-    def __init__(self, data_queue: Queue, fps = 25, scroll_ticks = 10) -> None:
-        self.data_queue = data_queue
-        self.fps = fps
+    def __init__(self, gaze_events: GazeEventBus, dwell = 0.4, scroll_ticks = 10, actuator: ScrollActuator = None) -> None:
+        self.gaze_events = gaze_events
+        # Seconds both eyes have to look the same way before it scrolls, then it scrolls again every dwell seconds
+        self.dwell = dwell
         self.scroll_ticks = scroll_ticks
+        self.actuator = actuator or ScrollActuator()
         return super().__init__()
 
     def run(self) -> None:
-        self.counter = 0
-        self.last_directions = []
+        self.actuator.load()
+        self.dwell_start = None
+        self.last_directions = ()
         while True:
-            directions = self.data_queue.get()
-            if directions == None:
+            event = self.gaze_events.get(self.actuator.time_to_flush(time.monotonic()))
+            if event is SHUTDOWN:
                 break
-            self.manage_scrolling(directions)
-            self.last_directions = directions
+            if event is not None:
+                self.manage_scrolling(event.directions, event.timestamp)
+                self.last_directions = event.directions
+            self.actuator.flush(time.monotonic())
 
-    def manage_scrolling(self, directions):
-        if len(directions) != 2 or not self.last_directions:
+    def manage_scrolling(self, directions, timestamp=None):
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if len(directions) != 2 or not self.last_directions or directions[0] is None:
+            self.dwell_start = None
             return
 
         if directions[0] == Direction.MIDDLE and directions[1] == Direction.MIDDLE:
+            self.dwell_start = None
             return
 
         if directions == self.last_directions and directions[0] == directions[1]:
-            self.counter += 1
+            if self.dwell_start is None:
+                self.dwell_start = timestamp
         else:
-            self.counter = 0
-        
-        if self.counter >= self.fps:
+            self.dwell_start = None
+
+        if self.dwell_start is not None and timestamp - self.dwell_start >= self.dwell:
             self.scroll(directions[0])
-            self.counter = 0
+            self.dwell_start = timestamp
 
     def scroll(self, direction: Direction):
-        if direction == Direction.UP:
-            pyautogui.scroll(self.scroll_ticks)
-            print('Scrolling UP')
-
-        elif direction == Direction.DOWN:
-            pyautogui.scroll(-self.scroll_ticks)
-            print('Scrolling DOWN')
-            
-        elif direction == Direction.RIGHT:
-            pyautogui.hscroll(self.scroll_ticks)
-            print('Scrolling RIGHT')
-
-        elif direction == Direction.LEFT:
-            pyautogui.hscroll(-self.scroll_ticks)
-            print('Scrolling LEFT')
\ No newline at end of file
+        self.actuator.request(direction, self.scroll_ticks)
@@ -0,0 +1,153 @@
+import numpy as np
+
+from iris import MID, UP, DOWN, LEFT, RIGHT, classify_offsets
+
+# Centre angle of every direction sector, see iris.classify_offsets (image is mirrored)
+SECTOR_ANGLES = {LEFT: 0, UP: 90, RIGHT: 180, DOWN: -90}
+
+
+class OneEuroFilter:
+    """One Euro filter (Casiez et al. 2012) of a vector signal.
+
+    Low cutoff for slow movements removes jitter, the cutoff grows with speed by beta,
+    so fast saccades are followed with little lag. A timestamp going backwards starts the filter over.
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=0.05, derivative_cutoff=1.0) -> None:
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.derivative_cutoff = derivative_cutoff
+        self.reset()
+
+    def reset(self) -> None:
+        self.value = None
+        self.derivative = None
+        self.timestamp = None
+
+    @staticmethod
+    def alpha(cutoff: float, dt: float) -> float:
+        tau = 1 / (2 * np.pi * cutoff)
+        return 1 / (1 + tau / dt)
+
+    def __call__(self, value, timestamp: float):
+        value = np.asarray(value, dtype=np.float64)
+        if self.value is None or timestamp < self.timestamp:
+            self.value = value
+            self.derivative = np.zeros_like(value)
+            self.timestamp = timestamp
+            return self.value
+
+        dt = max(timestamp - self.timestamp, 1e-3)
+        self.timestamp = timestamp
+        derivative = (value - self.value) / dt
+        self.derivative += self.alpha(self.derivative_cutoff, dt) * (derivative - self.derivative)
+        cutoff = self.min_cutoff + self.beta * np.linalg.norm(self.derivative)
+        self.value = self.value + self.alpha(cutoff, dt) * (value - self.value)
+        return self.value
+
+
+class KalmanFilter:
+    """Constant velocity Kalman filter of a 2D position, state is x, y, vx, vy.
+
+    A timestamp going backwards starts the filter over.
+    """
+
+    def __init__(self, process_noise=50.0, measurement_noise=1.0) -> None:
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.measurement = np.hstack([np.eye(2), np.zeros((2, 2))])
+        self.reset()
+
+    def reset(self) -> None:
+        self.state = None
+        self.covariance = None
+        self.timestamp = None
+
+    def __call__(self, value, timestamp: float):
+        value = np.asarray(value, dtype=np.float64)
+        if self.state is None or timestamp < self.timestamp:
+            self.state = np.hstack([value, np.zeros(2)])
+            self.covariance = np.diag([self.measurement_noise] * 2 + [self.process_noise] * 2)
+            self.timestamp = timestamp
+            return self.state[:2]
+
+        dt = max(timestamp - self.timestamp, 1e-3)
+        self.timestamp = timestamp
+        transition = np.eye(4)
+        transition[0, 2] = transition[1, 3] = dt
+        # White noise acceleration
+        q = self.process_noise
+        noise_1d = q * np.array([[dt ** 3 / 3, dt ** 2 / 2], [dt ** 2 / 2, dt]])
+        process = np.zeros((4, 4))
+        process[np.ix_([0, 2], [0, 2])] = noise_1d
+        process[np.ix_([1, 3], [1, 3])] = noise_1d
+
+        state = transition @ self.state
+        covariance = transition @ self.covariance @ transition.T + process
+        innovation_covariance = self.measurement @ covariance @ self.measurement.T \
+            + self.measurement_noise * np.eye(2)
+        gain = covariance @ self.measurement.T @ np.linalg.inv(innovation_covariance)
+        self.state = state + gain @ (value - self.measurement @ state)
+        self.covariance = (np.eye(4) - gain @ self.measurement) @ covariance
+        return self.state[:2]
+
+
+FILTERS = {
+    'one_euro': OneEuroFilter,
+    'kalman': KalmanFilter,
+}
+
+
+class EyeSmoother:
+    """Filters the pupil offset from the eye centre of one eye and classifies it with hysteresis.
+
+    Leaving 'Mid' needs a distance of enter_ratio * min_dist, returning to it a distance below min_dist.
+    Switching between two directions needs the angle to be hysteresis_degrees past the sector border.
+    The filter starts again when the eye was not seen for reset_after seconds or the timestamp went
+    backwards (another clip or chunk, a rewound recording). Frames on which the motion gate reused
+    the last result count as seen, see keep_alive().
+    """
+
+    def __init__(self, filter_name='one_euro', filter_parameters=None, enter_ratio=1.5,
+                 hysteresis_degrees=10, reset_after=0.5) -> None:
+        self.filter = FILTERS[filter_name](**(filter_parameters or {}))
+        self.enter_ratio = enter_ratio
+        self.hysteresis_degrees = hysteresis_degrees
+        self.reset_after = reset_after
+        self.label = MID
+        self.last_seen = None
+
+    def reset(self) -> None:
+        self.filter.reset()
+        self.label = MID
+        self.last_seen = None
+
+    def keep_alive(self, timestamp: float) -> None:
+        """The eye is still there but was not measured again, e.g. the frame did not change."""
+        if self.last_seen is not None and timestamp >= self.last_seen:
+            self.last_seen = timestamp
+
+    def update(self, offset, timestamp: float, min_dist: float):
+        """Returns (filtered offset, label) for the offset of the pupil from the eye centre."""
+        if self.last_seen is not None and not 0 <= timestamp - self.last_seen <= self.reset_after:
+            self.reset()
+        self.last_seen = timestamp
+
+        dx, dy = self.filter(offset, timestamp)
+        self.label = self.classify(dx, dy, min_dist)
+        return (dx, dy), self.label
+
+    def classify(self, dx: float, dy: float, min_dist: float) -> str:
+        distance = np.hypot(dx, dy)
+        if self.label == MID:
+            if distance <= min_dist * self.enter_ratio:
+                return MID
+            return classify_offsets(dx, dy, min_dist)
+        if distance <= min_dist:
+            return MID
+
+        angle = np.degrees(np.arctan2(-dy, dx))
+        difference = abs((angle - SECTOR_ANGLES[self.label] + 180) % 360 - 180)
+        if difference < 45 + self.hysteresis_degrees:
+            return self.label
+        return classify_offsets(dx, dy, min_dist)
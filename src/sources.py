@@ -0,0 +1,222 @@
+import os
+import time
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+RECORDING_EXTENSION = '.aocrec'
+
+
+class FrameSource:
+    """Iterable of (timestamp in seconds, BGR frame) pairs."""
+
+    def __iter__(self):
+        raise NotImplementedError
+
+    def frame_count(self):
+        """Number of frames, only an estimate for some video files, None when unknown."""
+        return None
+
+    def frames(self, start=0):
+        """(frame number, timestamp, frame) from frame number start on, sources which can seek override it."""
+        for frame_number, (timestamp, frame) in enumerate(self):
+            if frame_number >= start:
+                yield frame_number, timestamp, frame
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class CaptureSource(FrameSource):
+    def __init__(self, target) -> None:
+        self.cap = cv2.VideoCapture(target)
+        if not self.cap.isOpened():
+            print("Error opening video stream or file")
+
+    def timestamp(self) -> float:
+        raise NotImplementedError
+
+    def __iter__(self):
+        while self.cap.isOpened():
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            yield self.timestamp(), frame
+
+    def close(self) -> None:
+        self.cap.release()
+
+
+class CameraSource(CaptureSource):
+    def __init__(self, camera=0) -> None:
+        super().__init__(camera)
+
+    def timestamp(self) -> float:
+        return time.monotonic()
+
+
+class VideoFileSource(CaptureSource):
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+
+    def timestamp(self) -> float:
+        return self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+
+    def frame_count(self):
+        # Estimated from the duration by some containers, 0 when the container does not know
+        return int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT)) or None
+
+    def frames(self, start=0):
+        if start:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        for frame_number, (timestamp, frame) in enumerate(self, start):
+            yield frame_number, timestamp, frame
+
+
+class ImageDirectorySource(FrameSource):
+    """Images of a directory in name order, played back at the given frame rate."""
+
+    def __init__(self, path: str, fps=30) -> None:
+        self.paths = sorted(os.path.join(path, name) for name in os.listdir(path)
+                            if name.lower().endswith(IMAGE_EXTENSIONS))
+        self.fps = fps
+
+    def __iter__(self):
+        for _, timestamp, frame in self.frames():
+            yield timestamp, frame
+
+    def frame_count(self):
+        return len(self.paths)
+
+    def frames(self, start=0):
+        for i in range(start, len(self.paths)):
+            frame = cv2.imread(self.paths[i])
+            if frame is not None:
+                yield i, i / self.fps, frame
+
+
+class SyntheticSource(FrameSource):
+    """Generated frames of a drawn face, for runs without any recordings.
+
+    The face is drawn with brows and almond shaped eyes and slightly blurred, so the Haar cascades
+    find the face and both open eyes on every frame from 640x480 on. The gaze holds each offset of
+    gaze_pattern for gaze_frames frames and the eyes blink regularly, both are known exactly,
+    so detection and blink engines can be checked against them.
+    """
+
+    # Eyes are closed for the last blink_frames frames of every blink_period frames
+    blink_period = 50
+    blink_frames = 4
+    # Pupil offsets as fractions of the eye size, x to the right and y down in the image
+    gaze_pattern = ((0, 0), (1, 0), (0, 0), (-1, 0), (0, -1), (0, 1))
+    gaze_frames = 30
+
+    def __init__(self, frames=300, width=640, height=480, fps=30, seed=0) -> None:
+        self.frame_total = frames
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.seed = seed
+
+    def frame_count(self):
+        return self.frame_total
+
+    def gaze(self, i: int):
+        return self.gaze_pattern[i // self.gaze_frames % len(self.gaze_pattern)]
+
+    def eyes_closed(self, i: int) -> bool:
+        # At the end of the period, so blink detectors see open eyes first
+        return i % self.blink_period >= self.blink_period - self.blink_frames
+
+    def blinks(self, frames: int) -> int:
+        """Blinks completed in the first frames, a blink is complete on the first frame with open eyes."""
+        return sum(1 for i in range(1, frames) if self.eyes_closed(i - 1) and not self.eyes_closed(i))
+
+    def __iter__(self):
+        rng = np.random.default_rng(self.seed)
+        background = rng.integers(0, 60, (self.height, self.width, 3), dtype=np.uint8)
+        centre_x, centre_y = self.width // 2, self.height // 2
+        face_w, face_h = self.width // 5, int(self.height / 2.6)
+        eye_w = max(4, int(face_w * 0.18))
+        eye_h = max(2, int(eye_w * 0.45))
+        eye_dx, eye_y = face_w // 2, centre_y - face_h // 4
+        line = max(1, self.width // 320)
+        blur = self.width / 430
+
+        for i in range(self.frame_total):
+            frame = background.copy()
+            cv2.ellipse(frame, (centre_x, centre_y), (face_w, face_h), 0, 0, 360, (150, 180, 210), -1)
+            gaze_x, gaze_y = self.gaze(i)
+            for eye_x in (centre_x - eye_dx, centre_x + eye_dx):
+                cv2.ellipse(frame, (eye_x, eye_y - eye_h - eye_w // 3), (int(eye_w * 1.1), eye_h // 2),
+                            0, 180, 360, (40, 40, 60), max(2, eye_w // 5))
+                if self.eyes_closed(i):
+                    cv2.ellipse(frame, (eye_x, eye_y), (eye_w, max(1, eye_h // 3)), 0, 0, 180, (100, 120, 150), line)
+                    continue
+                cv2.ellipse(frame, (eye_x, eye_y), (eye_w, eye_h), 0, 0, 360, (235, 235, 235), -1)
+                pupil = (eye_x + int(gaze_x * eye_w * 0.4), eye_y + int(gaze_y * eye_h * 0.3))
+                iris_r = max(2, int(eye_h * 0.9))
+                cv2.circle(frame, pupil, iris_r, (70, 50, 30), -1)
+                cv2.circle(frame, pupil, max(1, iris_r // 2), (10, 10, 10), -1)
+                cv2.ellipse(frame, (eye_x, eye_y), (eye_w, eye_h), 0, 0, 360, (40, 40, 40), 2 * line)
+            cv2.line(frame, (centre_x, eye_y), (centre_x - face_w // 10, centre_y + face_h // 5),
+                     (110, 140, 170), 3 * line)
+            cv2.ellipse(frame, (centre_x, centre_y + face_h // 2), (face_w // 3, face_h // 12),
+                        0, 0, 180, (60, 60, 140), 4 * line)
+            yield i / self.fps, cv2.GaussianBlur(frame, (0, 0), blur)
+
+
+class RecordingSource(FrameSource):
+    """Session recording (see recording.py), as fast as possible or with the original timing when realtime."""
+
+    def __init__(self, path: str, realtime=False) -> None:
+        from recording import SessionReader
+
+        self.reader = SessionReader(path)
+        self.realtime = realtime
+
+    def __iter__(self):
+        started = time.monotonic()
+        for timestamp, frame in self.reader:
+            if self.realtime:
+                delay = started + timestamp - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            yield timestamp, frame
+
+    def frame_count(self):
+        return len(self.reader)
+
+    def frames(self, start=0):
+        if self.realtime:
+            yield from super().frames(start)
+            return
+        for i in range(start, len(self.reader)):
+            yield i, float(self.reader.timestamps[i]), self.reader.frame(i)
+
+    def close(self) -> None:
+        self.reader.close()
+
+
+def open_source(spec, realtime=False) -> FrameSource:
+    """Camera index, video file, image directory, session recording or 'synthetic[:frames]'.
+
+    realtime applies to session recordings only, other files are always read as fast as possible.
+    """
+    if isinstance(spec, int) or str(spec).isdigit():
+        return CameraSource(int(spec))
+    if str(spec).endswith(RECORDING_EXTENSION):
+        return RecordingSource(spec, realtime)
+    if str(spec).startswith('synthetic'):
+        _, _, frames = str(spec).partition(':')
+        return SyntheticSource(int(frames)) if frames else SyntheticSource()
+    if os.path.isdir(spec):
+        return ImageDirectorySource(spec)
+    return VideoFileSource(spec)
@@ -0,0 +1,50 @@
+"""Import time report, shows which modules make the application start slowly.
+
+Usage: python startup_report.py [--module app] [--top 15] [--budget 1.0]
+
+The module is imported in a fresh interpreter with -X importtime, the slowest imports
+(including their own imports) are listed. Exits with 1 when the whole import takes longer
+than the budget in seconds.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+
+def import_times(module: str):
+    """Returns list of (cumulative microseconds, self microseconds, module name) of every import."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True, check=True)
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        times.append((int(cumulative), int(own), name.strip()))
+    return times
+
+
+def main():
+    from consts import import_budget
+
+    parser = argparse.ArgumentParser(description='Import time report')
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--budget', type=float, default=import_budget, help='seconds')
+    args = parser.parse_args()
+
+    times = import_times(args.module)
+    total = next(cumulative for cumulative, _, name in times if name == args.module) / 1e6
+    print(f"import {args.module}: {total:.3f}s (budget {args.budget:.3f}s)")
+    for cumulative, own, name in sorted(times, reverse=True)[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  (self {own / 1000:6.1f} ms)  {name}")
+
+    if total > args.budget:
+        print("Import time over budget")
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import cv2
+
+
+class FaceTracker:
+    """Follows face boxes between full cascade detections with template matching.
+
+    The full-frame cascade is run every `redetect_interval` frames or when tracking is lost.
+    In between, every face is searched only in a window around its last box,
+    expanded by `search_margin` of the box size on every side.
+    """
+
+    def __init__(self, redetect_interval=10, search_margin=0.25, min_match_score=0.6, template_width=48) -> None:
+        self.redetect_interval = redetect_interval
+        self.search_margin = search_margin
+        self.min_match_score = min_match_score
+        # Templates are downscaled to this width, so the matching cost does not depend on camera resolution
+        self.template_width = template_width
+
+        self.boxes = []
+        self.templates = []
+        self.scales = []
+        self.frames_since_detection = 0
+
+    def needs_detection(self) -> bool:
+        return not self.boxes or self.frames_since_detection >= self.redetect_interval
+
+    def reset(self, gray, boxes) -> None:
+        self.boxes = [tuple(int(v) for v in box) for box in boxes]
+        self.scales = [min(1, self.template_width / w) for (x, y, w, h) in self.boxes]
+        self.templates = [self._scaled(gray[y: y + h, x: x + w], scale)
+                          for (x, y, w, h), scale in zip(self.boxes, self.scales)]
+        self.frames_since_detection = 0
+
+    def lose(self) -> None:
+        self.boxes = []
+        self.templates = []
+        self.scales = []
+
+    def search_window(self, box, frame_width, frame_height):
+        x, y, w, h = box
+        margin_x = int(w * self.search_margin)
+        margin_y = int(h * self.search_margin)
+        x_start = max(0, x - margin_x)
+        y_start = max(0, y - margin_y)
+        x_end = min(frame_width, x + w + margin_x)
+        y_end = min(frame_height, y + h + margin_y)
+        return x_start, y_start, x_end, y_end
+
+    def track(self, gray):
+        """Returns updated boxes or None when any of the faces was lost."""
+        frame_height, frame_width = gray.shape[:2]
+        tracked = []
+        for box, template, scale in zip(self.boxes, self.templates, self.scales):
+            x_start, y_start, x_end, y_end = self.search_window(box, frame_width, frame_height)
+            window = self._scaled(gray[y_start: y_end, x_start: x_end], scale)
+            if (template.shape[0] > window.shape[0] or template.shape[1] > window.shape[1]
+                    or template.size == 0):
+                self.lose()
+                return None
+
+            scores = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+            _, max_score, _, max_loc = cv2.minMaxLoc(scores)
+            if max_score < self.min_match_score:
+                self.lose()
+                return None
+
+            x = x_start + int(round(max_loc[0] / scale))
+            y = y_start + int(round(max_loc[1] / scale))
+            tracked.append((x, y, box[2], box[3]))
+
+        self.boxes = tracked
+        self.frames_since_detection += 1
+        return tracked
+
+    @staticmethod
+    def _scaled(image, scale):
+        if scale == 1:
+            return image
+        return cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
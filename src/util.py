@@ -1,14 +1,17 @@
+from collections import deque
 from copy import deepcopy
+from threading import Condition, Lock
+from time import monotonic
 
 
 class MyQueue:
     def __init__(self, size):
         self.list = []
-        self.size = size
+        self.max_size = size
 
     def push(self,item):
         self.list.append(item)
-        if len(self.list) > self.size:
+        if len(self.list) > self.max_size:
             del self.list[0]
 
     def pop(self):
@@ -23,10 +26,159 @@ class MyQueue:
         return len(self.list) == 0
 
     def isFull(self):
-        return len(self.list) >= self.size
+        return len(self.list) >= self.max_size
 
     def size(self):
         return len(self.list)
 
     def __str__(self):
-        return str(self.list)
\ No newline at end of file
+        return str(self.list)
+
+
+class TimedCountingQueue:
+    """Items pushed during the last `window` seconds with a count of every item.
+
+    Votes over it do not depend on the frame rate, a 15 FPS camera fills the same window
+    with half as many samples as a 30 FPS one. Timestamps are time.monotonic() seconds.
+    """
+    __slots__ = ('window', 'items', 'counts', 'started')
+
+    def __init__(self, window):
+        self.window = window
+        # (timestamp, item), oldest first
+        self.items = deque()
+        self.counts = {}
+        # Time of the first push after creation or clear()
+        self.started = None
+
+    def push(self, item, timestamp=None):
+        if timestamp is None:
+            timestamp = monotonic()
+        if self.started is None:
+            self.started = timestamp
+        self.items.append((timestamp, item))
+        self.counts[item] = self.counts.get(item, 0) + 1
+        self.expire(timestamp)
+
+    def expire(self, now):
+        oldest = now - self.window
+        while self.items and self.items[0][0] < oldest:
+            _, item = self.items.popleft()
+            count = self.counts[item] - 1
+            if count:
+                self.counts[item] = count
+            else:
+                del self.counts[item]
+
+    def count(self, item):
+        return self.counts.get(item, 0)
+
+    def fraction(self, item):
+        """Share of the samples in the window equal to item."""
+        return self.counts.get(item, 0) / len(self.items) if self.items else 0
+
+    def mode(self):
+        """Returns (most common item, its count), the item is None for an empty queue."""
+        if not self.counts:
+            return None, 0
+        return max(self.counts.items(), key=lambda item_count: item_count[1])
+
+    def clear(self):
+        self.items.clear()
+        self.counts.clear()
+        self.started = None
+
+    def isEmpty(self):
+        return not self.items
+
+    def isFull(self):
+        """True once samples cover the whole window."""
+        return bool(self.items) and self.items[-1][0] - self.started >= self.window
+
+    def size(self):
+        return len(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def list(self):
+        return [item for _, item in self.items]
+
+    def __str__(self):
+        return str(self.list)
+
+
+class EyeStatusQueue:
+    """Eye statuses of both eyes from the last `window` seconds with running tallies for the majority vote."""
+    __slots__ = ('window', 'left', 'right')
+
+    def __init__(self, window):
+        self.window = window
+        self.left = TimedCountingQueue(window)
+        self.right = TimedCountingQueue(window)
+
+    def push(self, eye_status, timestamp=None):
+        if timestamp is None:
+            timestamp = monotonic()
+        self.left.push(eye_status['Left'], timestamp)
+        self.right.push(eye_status['Right'], timestamp)
+
+    def clear(self):
+        self.left.clear()
+        self.right.clear()
+
+    def isEmpty(self):
+        return self.left.isEmpty()
+
+    def isFull(self):
+        return self.left.isFull()
+
+    def size(self):
+        return self.left.size()
+
+
+class FrameMailbox:
+    """Holds only the newest frame, older frames that were not taken yet are dropped."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.ready = Condition(self.lock)
+        self.frame = None
+        # Capture time of self.frame
+        self.timestamp = None
+        self.dropped = 0
+        self.delivered = 0
+
+    def put(self, frame, timestamp=None):
+        with self.lock:
+            if self.frame is not None:
+                self.dropped += 1
+            self.frame = frame
+            self.timestamp = monotonic() if timestamp is None else timestamp
+            self.ready.notify()
+
+    def wait_take(self, timeout=None):
+        """Like take(), but waits up to timeout seconds for a frame."""
+        item = self.wait_take_stamped(timeout)
+        return item[0] if item is not None else None
+
+    def wait_take_stamped(self, timeout=None):
+        """Like wait_take(), returns (frame, capture timestamp) or None."""
+        with self.lock:
+            if self.frame is None:
+                self.ready.wait(timeout)
+            frame = self.frame
+            self.frame = None
+            if frame is None:
+                return None
+            self.delivered += 1
+            return frame, self.timestamp
+
+    def take(self):
+        with self.lock:
+            frame = self.frame
+            self.frame = None
+            if frame is not None:
+                self.delivered += 1
+            return frame
\ No newline at end of file
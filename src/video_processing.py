@@ -1,25 +1,37 @@
+import cProfile
 import time
-import math
-import numpy as np
 from datetime import datetime
 
-import cv2
-from eye import Eye
-from PyQt5.QtCore import pyqtSignal, pyqtSlot, Qt, QThread
-from time import sleep
-
-from queue import Queue
-from src.consts import camera
-from util import MyQueue
-from chat_database import dialogues
-
-class VideoProcessing(QThread):
-    change_pixmap_signal = pyqtSignal(np.ndarray)
+from gaze import GazeDetector
+from PyQt5.QtCore import pyqtSignal, pyqtSlot, QThread
+
+from threading import Event
+from camera import CameraService
+from gaze_events import GazeEvent, GazeEventBus
+from util import TimedCountingQueue, EyeStatusQueue, FrameMailbox
+from phrases import DIRECTION_SLOTS, PhraseEngine
+from overlay import Compositor
+from metrics import metrics
+from quality import QualityController
+from consts import metrics_interval, profile_file, adaptive_quality, target_fps, latency_budget, \
+    voting_window_ms, smoothed_voting_window_ms, blink_window_ms, chat_select_cooldown_ms, phrases_file, \
+    phrase_usage_file, phrase_step_cooldown_ms, pipeline_workers, pipeline_slots
+
+class VideoProcessing(GazeDetector, QThread):
     update_chat_signal = pyqtSignal(str, str)
+    # metrics.snapshot() every metrics_interval seconds, for the on-screen overlay
+    metrics_signal = pyqtSignal(dict)
+
+    def __init__(self, gaze_events: GazeEventBus, mailbox: FrameMailbox, camera_service: CameraService) -> None:
+        # Gaze directions of every processed frame go here, for the Scroller
+        self.gaze_events = gaze_events
+        self.mailbox = mailbox
+        # Draws debug annotations and the dialogue onto preview frames
+        self.compositor = Compositor()
+        self.camera_service = camera_service
+        self.stop_event = Event()
+        self.pipeline = None
 
-    def __init__(self, data_queue: Queue) -> None:
-        self.face_cascade = cv2.CascadeClassifier('../resources/haarcascade_frontalface_default.xml')
-        self.eye_cascade = cv2.CascadeClassifier('../resources/haarcascade_eye.xml')
         # self.eye_status = {'Left': None,
         #                    'Right': None}  # Tracker for eye status
 
@@ -27,257 +39,242 @@ class VideoProcessing(QThread):
         self.eye_direction_sensitivity = 0.6
         self.blink_sensitivity = 0.5
 
-        self.blur_mask_size = 3
-        self.canny_param_1 = 30
-        self.canny_param_2 = 15
-        self.min_radius = 3
-        self.max_radius = 12
-        self.min_dist = 2
-
-        self.FACTOR = 0.015
-        # Iris position tracker
-        self.iris_min_dist = 2
-
-        self.current_chat_dataset = 0
+        # Phrase tree navigated by gaze directions, a blink goes back one screen
+        self.phrases = PhraseEngine.from_file(phrases_file, phrase_usage_file)
         self.FPS = -1
         self.is_blinking = False
-
-        return super().__init__()
+        self.blink_count = 0
+        # Eye direction and blink votes are taken over samples of the last voting_window / blink_window
+        # seconds, a chat message can be selected again after chat_select_cooldown seconds,
+        # the next screen after opening a group of phrases after phrase_step_cooldown seconds
+        self.voting_window = voting_window_ms / 1000
+        self.blink_window = blink_window_ms / 1000
+        self.chat_select_cooldown = chat_select_cooldown_ms / 1000
+        self.phrase_step_cooldown = phrase_step_cooldown_ms / 1000
+        self.select_cooldown = self.chat_select_cooldown
+        # Start of the current run of both eyes agreeing on a direction, for the selection latency metric
+        self.direction_onset = None
+
+        self.metrics_interval = metrics_interval
+        self.last_metrics_time = 0
+
+        # Number of detector processes of the capture/detect pipeline, 0 runs everything in this thread
+        self.pipeline_workers = pipeline_workers
+        self.pipeline_slots = pipeline_slots
+
+        # Adjusts detection settings to hold target_fps, only used without the pipeline
+        self.quality_controller = QualityController(target_fps, latency_budget) if adaptive_quality else None
+
+        GazeDetector.__init__(self)
+        QThread.__init__(self)
+        # Smoothed labels do not flicker, a much shorter vote is enough
+        if self.eye_smoothers is not None:
+            self.voting_window = smoothed_voting_window_ms / 1000
 
     @pyqtSlot(float)
     def change_blink_sensitivity(self, value: float):
         self.blink_sensitivity=1-value
         print(f"new eye_direction valuse: {self.blink_sensitivity}")
 
+    @pyqtSlot(str)
+    def change_pupil_locator(self, name: str):
+        self.set_pupil_locator(name)
+        print(f"new pupil locator: {name}")
+
     @pyqtSlot(float)
     def change_eye_direction_sensitivity(self, value: float):
         self.eye_direction_sensitivity = 1 - value
         print(f"new eye_direction valuse: {self.eye_direction_sensitivity}")
 
-    def detect_eyes_direction(self, ret, frame, eye_status_queue):
-
-        eye_status = {'Left': None,
-                      'Right': None}  # Tracker for eye status
-
-        frame_height, frame_width = len(frame), len(frame[0])
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(gray, 1.1, 4)
-
-        for (x_face, y_face, width_face, height_face) in faces:
-            face_gray = gray[y_face: y_face + height_face, x_face: x_face + width_face]
-            face_color = frame[y_face: y_face + height_face, x_face: x_face + width_face]
-
-            detected_eyes = self.eye_cascade.detectMultiScale(face_gray)
-            detected_eyes = sorted(detected_eyes, key=lambda el: el[1])
-            if len(detected_eyes) < 2:
-                print("Less than 2 eyes detected")
-
-            # TODO consider breaking if i >= 2 (more than 2 eye detected)
-            for i, (eye_x, eye_y, eye_width, eye_height) in enumerate(
-                    detected_eyes[:2 if len(detected_eyes) > 2 else len(detected_eyes)]):
-
-                cv2.rectangle(face_color,
-                              (eye_x, eye_y),
-                              (eye_x + eye_width,
-                               eye_y + eye_height),
-                              (0, 255, 0),
-                              2)
-
-                eye = Eye(face_gray[eye_y: eye_y + eye_height, eye_x: eye_x + eye_width],
-                          middle_block=(int(self.FACTOR * frame_width), int(self.FACTOR * frame_height)))
-
-                ey, ex = eye.get_center_of_frame()
-
-                # Center of Hough eye
-                cv2.circle(face_color, (eye_x + ex, eye_y + ey), 2, (0, 255, 0), thickness=-1)
-
-                # Crop eye
-                eye_frame = face_gray[eye_y: eye_y + eye_height, eye_x: eye_x + eye_width]
-                eye_blur = cv2.medianBlur(eye_frame, self.blur_mask_size)
-
-                circles = cv2.HoughCircles(eye_blur, cv2.HOUGH_GRADIENT, 1, self.min_dist,
-                                           param1=self.canny_param_1,
-                                           param2=self.canny_param_2,
-                                           minRadius=self.min_radius,
-                                           maxRadius=self.max_radius)
-
-                if circles is not None:
-                    circles = np.reshape(circles, (-1, 3))
-
-                    # Find circle, that is closest to middle of rectangle.
-                    closest_circle = [0, 0, 0, 9999]  # x, y, r, dist
-                    for c in circles:
-                        dist = np.sqrt((ex - c[0]) ** 2 + (ey - c[1]) ** 2)
-
-                        if dist < closest_circle[3]:
-                            closest_circle = [c[0], c[1], c[2], dist]
-
-                    # Print closest circle.
-                    cv2.circle(face_color,
-                               (eye_x + int(closest_circle[0]), eye_y + int(closest_circle[1])),
-                               2,
-                               (255, 0, 0),
-                               thickness=-1)
-                    cv2.circle(face_color,
-                               (eye_x + int(closest_circle[0]), eye_y + int(closest_circle[1])),
-                               int(closest_circle[2]),
-                               (255, 0, 0),
-                               thickness=1)
-
-                    # Set status of eye position tracker.
-                    dist = closest_circle[3]
-                    angle = math.degrees(math.atan2(-(closest_circle[1] - ey), closest_circle[0] - ex))
-                    # print(f'Position eye {i} : dist {dist}, angle {angle}')
-
-                    if i == 0:
-                        eye_ = 'Left'
-                    else:
-                        eye_ = "Right"
-
-                    if dist > self.iris_min_dist:
-                        if angle > -45 and angle < 45:
-                            # this is mirror image, that's why left and right are switched
-                            eye_status[eye_] = 'Left'
-                        elif angle > 45 and angle < 135:
-                            eye_status[eye_] = 'Up'
-                        elif angle > 135 or angle < -135:
-                            eye_status[eye_] = 'Right'
-                        elif angle > -135 and angle < -45:
-                            eye_status[eye_] = 'Down'
-                        else:
-                            eye_status[eye_] = 'Mid'
-
-                    else:
-                        eye_status[eye_] = 'Mid'
-        # TODO get status from here
-        # print(f'Eyes status {eye_status}')
-        return eye_status
-
-    def detect_eye_blink(self, ret, image) -> bool:
-        result = False
-
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        gray = cv2.bilateralFilter(gray, 5, 1, 1)
-
-        faces = self.face_cascade.detectMultiScale(gray, 1.3, 5, minSize=(200, 200))
-        if (len(faces) > 0):
-            for (x, y, w, h) in faces:
-                img = cv2.rectangle(image, (x, y), (x + w, y + h), (0, 255, 0), 2)
-
-                roi_face = gray[y:y + h, x:x + w]
-                roi_face_clr = image[y:y + h, x:x + w]
-                eyes = self.eye_cascade.detectMultiScale(roi_face, 1.3, 5, minSize=(50, 50))
-
-                if (len(eyes) >= 2):
-                    result = False
-                else:
-                    result = True
-        return result
-
-    def print_chat_dataset(self, frame, width: int, height: int):
-        currrent_dataset = dialogues[self.current_chat_dataset]
-        width = int(width)
-        height = int(height)
-        padding = 70
-        # up
-        cv2.putText(frame, currrent_dataset[0], (int(width/2), padding), cv2.FONT_HERSHEY_TRIPLEX, 0.5, (255, 255, 255), 1)
-        # down
-        cv2.putText(frame, currrent_dataset[1], (int(width / 2), height - padding), cv2.FONT_HERSHEY_TRIPLEX, 0.5, (255, 255, 255), 1)
-        # left
-        cv2.putText(frame, currrent_dataset[2], (padding, int(height / 2)), cv2.FONT_HERSHEY_TRIPLEX, 0.5,(255, 255, 255), 1)
-        # right
-        cv2.putText(frame, currrent_dataset[3], (width - padding, int(height / 2)), cv2.FONT_HERSHEY_TRIPLEX, 0.5,(255, 255, 255), 1)
-
     def change_chat_dataset(self):
-        datasets_count = len(dialogues)
-        self.current_chat_dataset += 1
-        if self.current_chat_dataset >= datasets_count:
-            self.current_chat_dataset = 0
+        if self.phrases.back():
+            print("Phrases: back")
+
+    def blink_detected(self):
+        print("Blink Detected.....!!!!")
+        self.blink_count += 1
+        self.change_chat_dataset()
+
+    def handle_blink(self, frame, blink: bool, blink_status_queue: TimedCountingQueue, timestamp=None):
+        if self.temporal_blink():
+            # Already a complete blink, durations were checked by the detector
+            if blink:
+                self.blink_detected()
+            return
 
-    def handle_blink(self, frame, blink: bool, blink_status_queue: MyQueue):
-        true_count = len([i for i in blink_status_queue.list if i == True])
+        true_fraction = blink_status_queue.fraction(True)
 
         if not blink:
             # cv2.putText(frame, "Eye's Open", (70, 70), cv2.FONT_HERSHEY_TRIPLEX, 1, (255, 255, 255), 2)
-            blink_status_queue.push(False)
+            blink_status_queue.push(False, timestamp)
             if self.is_blinking:
-                if (true_count / blink_status_queue.size) >= self.blink_sensitivity:
-                    print("Blink Detected.....!!!!")
+                if true_fraction >= self.blink_sensitivity:
                     self.is_blinking = False
-                    self.change_chat_dataset()
+                    self.blink_detected()
         else:
             # cv2.putText(frame, "Eye's Close.....!!!!", (70, 70), cv2.FONT_HERSHEY_TRIPLEX, 1, (0, 0, 0), 2)
-            blink_status_queue.push(True)
+            blink_status_queue.push(True, timestamp)
             self.is_blinking = True
 
-    def handle_chat_select(self, direction: str):
-        currrent_dataset = dialogues[self.current_chat_dataset]
+    def handle_chat_select(self, direction: str) -> bool:
+        """Returns True when a phrase was selected, False when a group of phrases was opened."""
+        if direction not in DIRECTION_SLOTS:
+            return False
+        text = self.phrases.select(DIRECTION_SLOTS[direction])
+        if text is None:
+            return False
         time = str(datetime.now().strftime("%H:%M:%S"))
-
-        if direction == 'Up':
-            self.update_chat_signal.emit(currrent_dataset[0], time)
-        elif direction == 'Down':
-            self.update_chat_signal.emit(currrent_dataset[1], time)
-        elif direction == 'Left':
-            self.update_chat_signal.emit(currrent_dataset[2], time)
-        elif direction == 'Right':
-            self.update_chat_signal.emit(currrent_dataset[3], time)
-
-    def handle_direction(self, eye_status, eye_status_queue: MyQueue):
-        time_between_chat_select = 3
-        eye_status_queue.push(eye_status)
+        self.update_chat_signal.emit(text, time)
+        return True
+
+    def handle_direction(self, eye_status, eye_status_queue: EyeStatusQueue, timestamp=None):
+        if timestamp is None:
+            timestamp = time.monotonic()
+        eye_status_queue.push(eye_status, timestamp)
+        if eye_status['Left'] in (None, 'Mid') or eye_status['Left'] != eye_status['Right']:
+            self.direction_onset = None
+        elif self.direction_onset is None:
+            self.direction_onset = timestamp
         if eye_status_queue.isFull():
-            left_eye_values = []
-            right_eye_values = []
-            for eye_status in eye_status_queue.list:
-                left_eye_values.append(eye_status['Left'])
-                right_eye_values.append(eye_status['Right'])
-
-            left_eye = max(set(left_eye_values), key=left_eye_values.count)
-            right_eye = max(set(right_eye_values), key=right_eye_values.count)
-            left_eye_count = left_eye_values.count(left_eye)
-            right_eye_count = right_eye_values.count(right_eye)
+            left_eye, left_eye_count = eye_status_queue.left.mode()
+            right_eye, right_eye_count = eye_status_queue.right.mode()
 
-            minimum_count = int(eye_status_queue.size * self.eye_direction_sensitivity)
+            minimum_count = int(eye_status_queue.size() * self.eye_direction_sensitivity)
 
-            if time.time() - self.last_time_chat_select >= time_between_chat_select:
-                if left_eye != 'None' and left_eye != 'Mid' and left_eye == right_eye:
+            if timestamp - self.last_time_chat_select >= self.select_cooldown:
+                if left_eye is not None and left_eye != 'Mid' and left_eye == right_eye:
                     if left_eye_count >= minimum_count and right_eye_count >= minimum_count:
-                        self.handle_chat_select(left_eye)
-                        self.last_time_chat_select = time.time()
+                        selected = self.handle_chat_select(left_eye)
+                        self.select_cooldown = self.chat_select_cooldown if selected else self.phrase_step_cooldown
+                        self.last_time_chat_select = timestamp
+                        if self.direction_onset is not None:
+                            metrics.record('selection_latency', timestamp - self.direction_onset)
                         eye_status_queue.clear()
 
-    def run(self) -> None:
-        self.lock = False
-        # cap = cv2.VideoCapture("../resources/video3.mp4")
-        cap = cv2.VideoCapture(camera)
-
-        width = cap.get(cv2.CAP_PROP_FRAME_WIDTH)
-        height = cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
-
-        if not cap.isOpened():
-            print("Error opening video stream or file")
-
-        eye_status_queue = MyQueue(15)
-        blink_status_queue = MyQueue(15)
-
-        self.last_time_chat_select = time.time()
-        while cap.isOpened():
-            if self.lock:
-                break
-            ret, frame = cap.read()
+    def stop(self) -> None:
+        self.stop_event.set()
+        if self.pipeline is not None:
+            self.pipeline.stop()
+
+    def run_pipeline(self, frames: FrameMailbox) -> None:
+        # Imported only when used, multiprocessing and shared memory are not needed otherwise
+        from pipeline import DetectionPipeline
+
+        self.pipeline = DetectionPipeline(workers=self.pipeline_workers, slots=self.pipeline_slots, frames=frames)
+        if self.stop_event.is_set() or not self.pipeline.start():
+            self.pipeline.join()
+            return
+
+        eye_status_queue = EyeStatusQueue(self.voting_window)
+        blink_status_queue = TimedCountingQueue(self.blink_window)
+
+        self.last_time_chat_select = time.monotonic()
+        try:
+            for result in self.pipeline.results():
+                if self.stop_event.is_set():
+                    # Keep draining until the workers are finished, so every slot gets released
+                    self.pipeline.release(result.slot)
+                    continue
+
+                # Workers are stateless, smoothing and blink dips run here on the frames in order
+                blink, eye_status = self.apply_temporal_state(result.blink, result.eye_status,
+                                                              result.measurements, result.timestamp)
+                with metrics.timer('voting'):
+                    self.handle_blink(result.frame, blink, blink_status_queue, result.timestamp)
+                    self.handle_direction(eye_status, eye_status_queue, result.timestamp)
+                self.gaze_events.put(GazeEvent.from_eye_status(eye_status, result.timestamp))
+
+                # The preview is a mirrored copy, so the shared slot can be reused right away
+                preview = self.compose_preview(result.frame, result.annotations) if self.preview_enabled() else None
+                self.pipeline.release(result.slot)
+                if preview is not None:
+                    with metrics.timer('emit'):
+                        self.mailbox.put(preview)
+                self.report_metrics()
+        except RuntimeError as e:
+            print(f"Detection pipeline failed: {e}, continuing in this thread")
+            self.pipeline.join()
+            self.pipeline = None
+            self.run_tracking(frames)
+            return
+
+        self.pipeline.join()
+
+    def run_tracking(self, frames: FrameMailbox) -> None:
+        eye_status_queue = EyeStatusQueue(self.voting_window)
+        blink_status_queue = TimedCountingQueue(self.blink_window)
+
+        self.last_time_chat_select = time.monotonic()
+        while not self.stop_event.is_set():
+            item = frames.wait_take_stamped(0.1)
+            if item is None:
+                continue
+            # Samples are timestamped with the frame capture, not the end of its processing
+            frame, timestamp = item
+            started = time.perf_counter()
+
+            # Detection does not draw into the frame, it is shared with other subscribers of the camera service
+            annotations = [] if self.preview_enabled() else None
+            blink, eye_status = self.detect(frame, annotations, timestamp)
+
+            with metrics.timer('voting'):
+                self.handle_blink(frame, blink, blink_status_queue, timestamp)
+                self.handle_direction(eye_status, eye_status_queue, timestamp)
+            self.gaze_events.put(GazeEvent.from_eye_status(eye_status, timestamp))
+            self.update_quality(time.perf_counter() - started)
+
+            if annotations is not None:
+                preview = self.compose_preview(frame, annotations)
+                with metrics.timer('emit'):
+                    self.mailbox.put(preview)
+            self.report_metrics()
+
+    def preview_enabled(self) -> bool:
+        # Only PreviewMailbox can be switched off, by the GUI when the preview is hidden
+        return getattr(self.mailbox, 'enabled', True)
+
+    def compose_preview(self, frame, annotations):
+        with metrics.timer('compose'):
+            return self.compositor.compose(frame, annotations, self.phrases.dialogue(), self.phrases.key())
+
+    def update_quality(self, seconds: float) -> None:
+        if self.quality_controller is None:
+            return
+        level = self.quality_controller.update(seconds)
+        if level is not None:
+            self.set_quality(level)
+            print(f"quality level: {level.name}")
+
+    def report_metrics(self) -> None:
+        metrics.tick('tracking')
+        now = time.monotonic()
+        if now - self.last_metrics_time >= self.metrics_interval:
+            self.last_metrics_time = now
+            self.FPS = metrics.rate('tracking')
+            self.metrics_signal.emit(metrics.snapshot())
 
-            if ret:
-                blink = self.detect_eye_blink(ret, frame)
-                eye_status = self.detect_eyes_direction(ret, frame, eye_status_queue)
-
-                self.handle_blink(frame, blink, blink_status_queue)
-                self.handle_direction(eye_status, eye_status_queue)
-
-                frame = cv2.flip(frame, 1)
-                self.print_chat_dataset(frame, width, height)
-
-                self.change_pixmap_signal.emit(frame)
-
-        cap.release()
-        cv2.destroyAllWindows()
+    def run(self) -> None:
+        frames = FrameMailbox()
+        self.camera_service.subscribe(frames.put)
+        metrics.gauge('tracker_dropped', lambda: frames.dropped)
+        metrics.gauge('gaze_events_dropped', lambda: self.gaze_events.dropped)
+        if self.quality_controller is not None:
+            metrics.gauge('quality', lambda: self.quality_controller.level.name)
+        profile = None
+        if profile_file:
+            profile = cProfile.Profile()
+            profile.enable()
+        try:
+            if self.pipeline_workers > 0:
+                self.run_pipeline(frames)
+            else:
+                self.run_tracking(frames)
+        finally:
+            self.camera_service.unsubscribe(frames.put)
+            self.phrases.close()
+            metrics.remove_gauge('tracker_dropped')
+            metrics.remove_gauge('gaze_events_dropped')
+            metrics.remove_gauge('quality')
+            if profile is not None:
+                profile.disable()
+                profile.dump_stats(profile_file)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modules of src/ import each other by their plain names, like when the app is started from src/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
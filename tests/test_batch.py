@@ -0,0 +1,54 @@
+import json
+
+from batch import PROGRESS_FILE, BatchRunner, clip_chunks, output_path
+
+CLIP = 'synthetic:40'
+
+
+def run(output_dir, chunk_frames=15):
+    BatchRunner([CLIP], str(output_dir), workers=2, chunk_frames=chunk_frames).run()
+    with open(output_path(str(output_dir), CLIP), 'rb') as file:
+        return file.read()
+
+
+def frames(output: bytes):
+    return [json.loads(line)['frame'] for line in output.decode().splitlines()]
+
+
+def progress(output_dir):
+    with open(output_dir / PROGRESS_FILE) as file:
+        return json.load(file)[CLIP]
+
+
+def test_synthetic_chunks_end_open():
+    assert clip_chunks(CLIP, 15) == [(0, 15), (15, 30), (30, None)]
+
+
+def test_batch_processes_every_frame_of_a_synthetic_clip(tmp_path):
+    output = run(tmp_path)
+    assert frames(output) == list(range(40))
+    state = progress(tmp_path)
+    assert state['next_chunk'] == state['chunks'] == 3
+    assert state['offset'] == len(output)
+
+
+def test_batch_resumes_after_an_interrupted_run(tmp_path):
+    complete = run(tmp_path)
+
+    # As if the run was killed after the first chunk while writing the second one
+    first_chunk = b''.join(complete.splitlines(keepends=True)[:15])
+    path = tmp_path / PROGRESS_FILE
+    state = json.loads(path.read_text())
+    state[CLIP].update(next_chunk=1, offset=len(first_chunk))
+    path.write_text(json.dumps(state))
+    with open(output_path(str(tmp_path), CLIP), 'wb') as file:
+        file.write(first_chunk + b'{"frame": 15, "timest')
+
+    assert run(tmp_path) == complete
+
+
+def test_batch_starts_over_when_chunk_frames_changed(tmp_path):
+    run(tmp_path)
+    output = run(tmp_path, chunk_frames=25)
+    assert frames(output) == list(range(40))
+    assert progress(tmp_path)['chunk_frames'] == 25
@@ -0,0 +1,41 @@
+import os
+
+from chat_history import ChatHistoryModel, ChatLog
+
+
+def test_log_file_is_created_by_the_first_phrase(tmp_path):
+    log = ChatLog.for_session(str(tmp_path / 'logs'))
+    log.flush()
+    log.close()
+    assert not os.path.exists(log.path)
+
+    log = ChatLog(log.path)
+    log.append('10:00:00', 'water')
+    log.close()
+    assert ChatLog(log.path).read(0, 1) == [('10:00:00', 'water')]
+
+
+def test_model_keeps_capacity_rows_without_scrolling_back(tmp_path):
+    model = ChatHistoryModel(ChatLog(str(tmp_path / 'log.jsonl')), capacity=5)
+    for i in range(8):
+        model.add(f'phrase {i}', f'10:00:0{i}')
+    assert model.rowCount() == 5
+    assert model.rows[0] == ('10:00:07', 'phrase 7')
+    assert model.oldest_index == 3
+    assert model.canFetchMore()
+
+
+def test_model_does_not_trim_rows_fetched_by_scrolling_back(tmp_path):
+    path = str(tmp_path / 'log.jsonl')
+    log = ChatLog(path)
+    for i in range(10):
+        log.append(f'09:00:{i:02}', f'old {i}')
+    log.close()
+
+    model = ChatHistoryModel(ChatLog(path), capacity=3, page_size=4)
+    model.fetchMore()
+    assert [text for _, text in model.rows] == ['old 9', 'old 8', 'old 7', 'old 6']
+    model.add('new', '10:00:00')
+    assert [text for _, text in model.rows] == ['new', 'old 9', 'old 8', 'old 7', 'old 6']
+    assert model.oldest_index == 6
+    model.log.close()
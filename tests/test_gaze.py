@@ -0,0 +1,22 @@
+import pytest
+
+from gaze import GazeDetector
+from smoothing import EyeSmoother
+from sources import SyntheticSource
+
+
+@pytest.mark.parametrize('fps', [15, 25, 30])
+def test_motion_gate_does_not_reset_smoothers_of_a_still_face(monkeypatch, fps):
+    resets = []
+    reset = EyeSmoother.reset
+    monkeypatch.setattr(EyeSmoother, 'reset', lambda self: (resets.append(self), reset(self)))
+
+    detector = GazeDetector()
+    assert detector.motion_gate is not None and detector.eye_smoothers is not None
+    _, frame = next(iter(SyntheticSource(1)))
+    seen = 0
+    for i in range(5 * fps):
+        _, eye_status = detector.detect(frame, None, i / fps)
+        seen += eye_status['Left'] is not None
+    assert seen == 5 * fps
+    assert resets == []
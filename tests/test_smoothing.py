@@ -0,0 +1,142 @@
+import numpy as np
+import pytest
+
+from iris import MID, UP, LEFT
+from smoothing import EyeSmoother, FILTERS, KalmanFilter, OneEuroFilter
+
+FPS = 30
+MIN_DIST = 10
+
+
+def feed(smoother, offset, start, frames=60):
+    """Feeds the same offset for frames frames from start seconds on, returns the last result and the end time."""
+    result = None
+    for i in range(frames):
+        result = smoother.update(offset, start + i / FPS, MIN_DIST)
+    return result, start + frames / FPS
+
+
+def polar(distance, degrees):
+    # Offsets have y pointing down, angles are counter-clockwise like in iris.classify_offsets
+    radians = np.radians(degrees)
+    return distance * np.cos(radians), -distance * np.sin(radians)
+
+
+@pytest.mark.parametrize('name', list(FILTERS))
+def test_filter_passes_first_sample_and_holds_constant_input(name):
+    smoothing_filter = FILTERS[name]()
+    assert np.allclose(smoothing_filter((3.0, -2.0), 0.0), (3.0, -2.0))
+    for i in range(1, 30):
+        value = smoothing_filter((3.0, -2.0), i / FPS)
+    assert np.allclose(value, (3.0, -2.0))
+
+
+def test_one_euro_reduces_jitter():
+    rng = np.random.default_rng(0)
+    smoothing_filter = OneEuroFilter()
+    noisy = rng.normal(0, 2, (300, 2))
+    filtered = np.array([smoothing_filter(value, i / FPS) for i, value in enumerate(noisy)])
+    assert filtered[30:].std() < noisy[30:].std() / 2
+
+
+def test_one_euro_follows_a_step():
+    smoothing_filter = OneEuroFilter()
+    for i in range(30):
+        smoothing_filter((0.0, 0.0), i / FPS)
+    for i in range(30, 60):
+        value = smoothing_filter((20.0, 0.0), i / FPS)
+    assert value[0] == pytest.approx(20, abs=1)
+
+
+@pytest.mark.parametrize('name', list(FILTERS))
+def test_filter_starts_over_when_time_goes_backwards(name):
+    smoothing_filter = FILTERS[name]()
+    for i in range(30):
+        smoothing_filter((20.0, 20.0), 10 + i / FPS)
+    assert np.allclose(smoothing_filter((-5.0, 1.0), 0.0), (-5.0, 1.0))
+
+
+def test_kalman_predicts_constant_velocity():
+    smoothing_filter = KalmanFilter()
+    for i in range(60):
+        value = smoothing_filter((i / FPS * 30, 0.0), i / FPS)
+    # Follows a steady movement without lagging behind
+    assert value[0] == pytest.approx(59, abs=0.5)
+
+
+def test_smoother_needs_enter_ratio_to_leave_mid():
+    smoother = EyeSmoother()
+    (_, label), end = feed(smoother, polar(MIN_DIST * 1.4, 0), 0)
+    assert label == MID
+    (_, label), _ = feed(smoother, polar(MIN_DIST * 1.6, 0), end)
+    assert label == LEFT
+
+
+def test_smoother_returns_to_mid_only_below_min_dist():
+    smoother = EyeSmoother()
+    (_, label), end = feed(smoother, polar(20, 0), 0)
+    assert label == LEFT
+    (_, label), end = feed(smoother, polar(MIN_DIST * 1.2, 0), end)
+    assert label == LEFT
+    (_, label), _ = feed(smoother, polar(MIN_DIST * 0.8, 0), end)
+    assert label == MID
+
+
+def test_smoother_keeps_direction_within_hysteresis_degrees():
+    smoother = EyeSmoother(hysteresis_degrees=10)
+    (_, label), end = feed(smoother, polar(20, 0), 0)
+    assert label == LEFT
+    # Past the 45 degree border into the up sector, but not by 10 degrees
+    (_, label), end = feed(smoother, polar(20, 52), end)
+    assert label == LEFT
+    (_, label), _ = feed(smoother, polar(20, 60), end)
+    assert label == UP
+
+
+def test_smoother_does_not_flicker_on_noise_at_the_border():
+    rng = np.random.default_rng(1)
+    smoother = EyeSmoother()
+    _, end = feed(smoother, polar(20, 45), 0)
+    labels = set()
+    for i in range(90):
+        offset = np.array(polar(20, 45)) + rng.normal(0, 1, 2)
+        labels.add(smoother.update(offset, end + i / FPS, MIN_DIST)[1])
+    assert len(labels) == 1
+
+
+@pytest.mark.parametrize('timestamp', [100.0, 9.0, 0.0])
+def test_smoother_resets_after_a_gap_or_when_time_goes_backwards(timestamp):
+    smoother = EyeSmoother(reset_after=0.5)
+    (_, label), _ = feed(smoother, polar(20, 0), 10)
+    assert label == LEFT
+    # Starting over, the first sample is taken as it is and the label starts from 'Mid'
+    offset, label = smoother.update(polar(MIN_DIST * 1.2, 0), timestamp, MIN_DIST)
+    assert np.allclose(offset, polar(MIN_DIST * 1.2, 0))
+    assert label == MID
+
+
+def test_smoother_reset():
+    smoother = EyeSmoother()
+    feed(smoother, polar(20, 0), 0)
+    smoother.reset()
+    assert smoother.label == MID
+    assert smoother.last_seen is None
+    offset, _ = smoother.update((1.0, 2.0), 5.0, MIN_DIST)
+    assert np.allclose(offset, (1.0, 2.0))
+
+
+def test_smoother_keep_alive_bridges_frames_without_a_measurement():
+    smoother = EyeSmoother(reset_after=0.5)
+    (_, label), end = feed(smoother, polar(20, 0), 0)
+    assert label == LEFT
+    # A still frame is reused for longer than reset_after
+    for i in range(30):
+        smoother.keep_alive(end + i / FPS)
+    (_, label), _ = feed(smoother, polar(MIN_DIST * 1.2, 0), end + 30 / FPS, frames=1)
+    assert label == LEFT
+
+
+def test_smoother_keep_alive_does_not_start_a_lost_eye():
+    smoother = EyeSmoother()
+    smoother.keep_alive(1.0)
+    assert smoother.last_seen is None